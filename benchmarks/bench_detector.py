@@ -0,0 +1,213 @@
+"""
+Benchmark reproducible del pipeline de detección (sin red ni cámaras).
+
+Genera videos sintéticos en varias resoluciones y duraciones, los procesa con
+AccidentDetector en modo headless y reporta FPS por etapa (decode, inference,
+annotate, write), latencia por frame p50/p95/p99 y memoria pico (RSS).
+Cada caso corre en un proceso aparte para que el RSS pico sea solo suyo.
+
+Ejemplos:
+    python benchmarks/bench_detector.py --stub --out bench.json
+    python benchmarks/bench_detector.py --model best.pt --resolutions 1280x720 --seconds 10
+    python benchmarks/bench_detector.py --stub --stub-ms 15 --modes sequential,pipelined_batch4
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+
+# configuraciones del detector que se comparan
+MODES = {
+    'sequential': {},
+    'batch4': {'batch_size': 4},
+    'pipelined': {'pipelined': True},
+    'pipelined_batch4': {'pipelined': True, 'batch_size': 4},
+    'stride3': {'frame_stride': 3},
+    'motion': {'motion_gate': True},
+}
+
+# mismas clases que yolov8/data.yaml
+STUB_NAMES = {0: 'Accident', 1: 'NoAcciednt', 2: 'car', 3: 'mild',
+              4: 'moderate', 5: 'motor cycle', 6: 'severe'}
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """
+    Modelo de reemplazo con la interfaz de YOLO (`model(frames)`, `model.names`).
+
+    Marca 'severe' cuando el bloque marcador del video sintético está encendido y
+    agrega `cars` cajas de 'car' por frame. `latency_ms` simula el costo de la red
+    por frame, para medir el pipeline por separado del costo real de YOLO.
+    """
+
+    names = STUB_NAMES
+
+    def __init__(self, latency_ms: float = 0.0, cars: int = 20):
+        self.latency = latency_ms / 1000.0
+        self.cars = cars
+
+    def _predict(self, frame):
+        h, w = frame.shape[:2]
+        rows = []
+        for i in range(self.cars):
+            x = (i * 97) % max(1, w - 60)
+            y = (i * 53) % max(1, h - 40)
+            rows.append((x, y, x + 60, y + 40, 0.8, 2))
+        if frame[:8, :8, 2].mean() > 128:
+            rows.append((w // 3, h // 3, w // 2, h // 2, 0.9, 6))
+        data = np.array(rows, dtype=np.float32).reshape(-1, 6)
+        return _Result(_Boxes(data[:, :4], data[:, 4], data[:, 5]))
+
+    def __call__(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        if self.latency:
+            time.sleep(self.latency * len(frames))
+        return [self._predict(frame) for frame in frames]
+
+
+def make_video(path: str, width: int, height: int, seconds: float, fps: int = 25, seed: int = 0):
+    """Video sintético: autos en movimiento y un tramo central marcado como accidente."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * fps)
+    crash = range(int(total * 0.4), int(total * 0.6))
+    cars = rng.integers(0, [width, height], size=(12, 2))
+    speeds = rng.integers(-6, 7, size=(12, 2))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.full((height, width, 3), 90, np.uint8)
+    for i in range(total):
+        frame = background.copy()
+        for (x, y), (dx, dy) in zip(cars, speeds):
+            cx, cy = int((x + dx * i) % width), int((y + dy * i) % height)
+            cv2.rectangle(frame, (cx, cy), (cx + 50, cy + 30), (200, 180, 40), -1)
+        if i in crash:
+            frame[:8, :8] = (0, 0, 255)
+        writer.write(frame)
+    writer.release()
+    return total
+
+
+def run_case(case: dict) -> dict:
+    """Corre un caso en este proceso y retorna sus métricas."""
+    from traffic_accident_detector.detector import AccidentDetector
+    from traffic_accident_detector.metrics import StageTimer
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        kwargs = dict(MODES[case['mode']])
+        if case.get('model'):
+            kwargs['model_path'] = case['model']
+        else:
+            kwargs['model'] = StubModel(case.get('stub_ms', 0.0))
+        detector = AccidentDetector(output_dir=os.path.join(tmp, 'clips'),
+                                    retrain_dir=os.path.join(tmp, 'dataset'),
+                                    headless=True, metrics=timer, **kwargs)
+        started = time.perf_counter()
+        detector.detect_from_video(case['video'])
+        elapsed = time.perf_counter() - started
+
+    summary = timer.summary()
+    frames = (detector.last_run_stats or {}).get('frames', 0)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    return {
+        **{k: v for k, v in case.items() if k != 'video'},
+        'frames': frames,
+        'elapsed_s': elapsed,
+        'total_fps': frames / elapsed if elapsed > 0 else None,
+        'stage_fps': {stage: v['fps'] for stage, v in summary['stages'].items()},
+        'stages': summary['stages'],
+        'latency_ms': summary['latency_ms'],
+        'peak_rss_mb': peak_rss_mb,
+        'inference_rate': (detector.last_run_stats or {}).get('inference_rate'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de detección")
+    parser.add_argument('--resolutions', default='640x360,1280x720,1920x1080')
+    parser.add_argument('--seconds', default='4,12', help="duraciones de los videos (s)")
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--modes', default='sequential,batch4,pipelined,pipelined_batch4')
+    parser.add_argument('--stub', action='store_true', help="usar StubModel en vez de YOLO")
+    parser.add_argument('--stub-ms', type=float, default=0.0, help="latencia simulada por frame")
+    parser.add_argument('--model', help="ruta a best.pt (si no se usa --stub)")
+    parser.add_argument('--video-dir', default=os.path.join(tempfile.gettempdir(), 'tad_bench'))
+    parser.add_argument('--out', help="archivo JSON de salida (por defecto stdout)")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    if not args.stub and not args.model:
+        parser.error("indica --stub o --model")
+
+    os.makedirs(args.video_dir, exist_ok=True)
+    runs = []
+    for res in args.resolutions.split(','):
+        width, height = map(int, res.lower().split('x'))
+        for seconds in map(float, args.seconds.split(',')):
+            video = os.path.join(args.video_dir, f"synthetic_{width}x{height}_{seconds:g}s_{args.fps}fps.mp4")
+            if not os.path.exists(video):
+                make_video(video, width, height, seconds, args.fps)
+            for mode in args.modes.split(','):
+                case = {'mode': mode, 'resolution': res, 'seconds': seconds, 'video': video,
+                        'model': None if args.stub else args.model,
+                        'stub_ms': args.stub_ms if args.stub else None}
+                proc = subprocess.run([sys.executable, __file__, '--case', json.dumps(case)],
+                                      capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(proc.stderr, file=sys.stderr)
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                runs.append(result)
+                lat = result['latency_ms']
+                print(f"{res:>10} {seconds:>5g}s {mode:<18} {result['total_fps']:8.1f} fps  "
+                      f"p50 {lat.get('p50', 0):6.1f} ms  p99 {lat.get('p99', 0):6.1f} ms  "
+                      f"RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': 'stub' if args.stub else args.model,
+            'stub_ms': args.stub_ms if args.stub else None,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
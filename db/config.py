@@ -0,0 +1,38 @@
+import os
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # python-dotenv es opcional: sin él se usan solo las variables del entorno
+    load_dotenv = None
+
+if load_dotenv is not None:
+    load_dotenv()
+
+# 'sqlite' (por defecto) o 'mysql'
+DB_BACKEND = os.getenv('DB_BACKEND', 'sqlite')
+
+# archivo de SQLite
+SQLITE_PATH = os.getenv('DB_SQLITE_PATH',
+                        os.path.join(os.path.dirname(__file__), '..', 'resultados', 'eventos.db'))
+
+# conexión a MySQL (mysql-connector-python)
+MYSQL_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', '3306')),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'accidentes'),
+}
+
+# conexiones abiertas en el pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+
+def get_config() -> dict:
+    """Configuración de la base de datos de eventos, lista para EventStore."""
+    return {
+        'backend': DB_BACKEND,
+        'sqlite_path': SQLITE_PATH,
+        'mysql': dict(MYSQL_CONFIG),
+        'pool_size': DB_POOL_SIZE,
+    }
@@ -0,0 +1,342 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# columnas de un evento, en el orden de la tabla
+COLUMNS = ('id', 'camera', 'started_at', 'ended_at', 'label', 'peak_confidence',
+           'clip_path', 'snapshot_paths')
+
+# orden permitido -> columnas de la clave (cada una cubierta por un índice)
+SORT_KEYS = {
+    'started_at': ('started_at', 'id'),
+    'camera': ('camera', 'started_at', 'id'),
+    'label': ('label', 'started_at', 'id'),
+}
+
+
+class SQLiteBackend:
+    """SQLite con un pool de conexiones reutilizables entre hilos (modo WAL)."""
+
+    param = '?'
+
+    def __init__(self, path: str, pool_size: int = 4):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._pool = queue.LifoQueue()
+        for _ in range(max(1, pool_size)):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')    # lectores no bloquean al escritor
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def schema(self):
+        return [
+            """CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                camera TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                ended_at REAL,
+                label TEXT NOT NULL,
+                peak_confidence REAL NOT NULL,
+                clip_path TEXT,
+                snapshot_paths TEXT
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_events_started ON events (started_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_events_camera ON events (camera, started_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_events_label ON events (label, started_at, id)",
+        ]
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class MySQLBackend:
+    """MySQL a través del pool de mysql-connector-python."""
+
+    param = '%s'
+
+    def __init__(self, config: dict, pool_size: int = 4):
+        from mysql.connector import pooling
+
+        self._pool = pooling.MySQLConnectionPool(pool_name='eventos', pool_size=max(1, pool_size),
+                                                 **config)
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()  # la devuelve al pool
+
+    def schema(self):
+        return [
+            """CREATE TABLE IF NOT EXISTS events (
+                id BIGINT PRIMARY KEY AUTO_INCREMENT,
+                camera VARCHAR(255) NOT NULL,
+                started_at DOUBLE NOT NULL,
+                ended_at DOUBLE NULL,
+                label VARCHAR(64) NOT NULL,
+                peak_confidence DOUBLE NOT NULL,
+                clip_path TEXT NULL,
+                snapshot_paths TEXT NULL,
+                INDEX idx_events_started (started_at, id),
+                INDEX idx_events_camera (camera, started_at, id),
+                INDEX idx_events_label (label, started_at, id)
+            )""",
+        ]
+
+    def close(self):
+        pass
+
+
+def make_backend(config: dict = None):
+    """Backend según db/config.py (o el dict indicado)."""
+    if config is None:
+        from db.config import get_config
+        config = get_config()
+    if config['backend'] == 'sqlite':
+        return SQLiteBackend(config['sqlite_path'], config['pool_size'])
+    if config['backend'] == 'mysql':
+        return MySQLBackend(config['mysql'], config['pool_size'])
+    raise ValueError(f"Backend desconocido: {config['backend']}. Opciones: sqlite, mysql")
+
+
+class EventStore:
+    """
+    Repositorio de eventos de accidente.
+
+    `add` solo encola el evento: un hilo los inserta por lotes (hasta
+    `batch_size` filas o cada `flush_interval` segundos) en una sola
+    transacción, así los hilos de detección nunca esperan a la base de datos.
+    Si la base no responde, el lote se reintenta; con más de `max_pending`
+    eventos en espera se descartan los más viejos.
+    """
+
+    def __init__(self, backend=None, batch_size: int = 64, flush_interval: float = 1.0,
+                 max_pending: int = 10000):
+        self.backend = backend if backend is not None else make_backend()
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        with self.backend.connection() as conn:
+            cur = conn.cursor()
+            for statement in self.backend.schema():
+                cur.execute(statement)
+            conn.commit()
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._flush_requested = False
+        self._closed = False
+        self.inserted = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="event-store", daemon=True)
+        self._thread.start()
+
+    # -- escritura ---------------------------------------------------------------
+
+    def add(self, camera: str, started_at: float, label: str, peak_confidence: float,
+            clip_path: str = None, snapshot_paths=(), ended_at: float = None) -> bool:
+        """Encola un evento (tiempos en segundos epoch). No bloquea."""
+        row = (str(camera), float(started_at), None if ended_at is None else float(ended_at),
+               label, float(peak_confidence), clip_path, json.dumps(list(snapshot_paths)))
+        with self._cond:
+            if self._closed:
+                return False
+            self._pending.append(row)
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            # despertar al escritor con el primer evento (empieza el intervalo) o con un lote lleno
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera a que todo lo encolado quede guardado. False si venció el tiempo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.backend.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # esperar a juntar un lote, a que venza el intervalo o a un flush
+                deadline = None
+                while not (self._closed or self._flush_requested or
+                           len(self._pending) >= self.batch_size):
+                    if not self._pending:
+                        deadline = None
+                        self._cond.wait()
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._pending:
+                    self._flush_requested = False
+                    if self._closed:
+                        return
+                    continue
+                batch = [self._pending.popleft()
+                         for _ in range(min(self.batch_size, len(self._pending)))]
+                self._writing = len(batch)
+            ok = self._insert(batch)
+            with self._cond:
+                self._writing = 0
+                if not ok:
+                    self._pending.extendleft(reversed(batch))  # reintentar en orden
+                self._cond.notify_all()
+            if not ok:
+                time.sleep(self.flush_interval)
+
+    def _insert(self, batch) -> bool:
+        p = self.backend.param
+        sql = (f"INSERT INTO events (camera, started_at, ended_at, label, peak_confidence, "
+               f"clip_path, snapshot_paths) VALUES ({', '.join([p] * 7)})")
+        try:
+            with self.backend.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.executemany(sql, batch)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            self.inserted += len(batch)
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"Error al guardar eventos ({len(batch)}): {e}")
+            return False
+
+    # -- lectura -----------------------------------------------------------------
+
+    def _where(self, camera=None, label=None, since=None, until=None):
+        p = self.backend.param
+        clauses, params = [], []
+        if camera is not None:
+            clauses.append(f"camera = {p}")
+            params.append(camera)
+        if label is not None:
+            clauses.append(f"label = {p}")
+            params.append(label)
+        if since is not None:
+            clauses.append(f"started_at >= {p}")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"started_at < {p}")
+            params.append(until)
+        return clauses, params
+
+    def _fetch(self, sql, params):
+        with self.backend.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            conn.commit()  # cierra la transacción de lectura (MySQL la deja abierta)
+        return [self._row(r) for r in rows]
+
+    @staticmethod
+    def _row(values) -> dict:
+        event = dict(zip(COLUMNS, values))
+        event['snapshot_paths'] = json.loads(event['snapshot_paths'] or '[]')
+        return event
+
+    def get(self, event_id: int):
+        p = self.backend.param
+        rows = self._fetch(f"SELECT {', '.join(COLUMNS)} FROM events WHERE id = {p}", [event_id])
+        return rows[0] if rows else None
+
+    def query(self, camera: str = None, label: str = None, since: float = None,
+              until: float = None, limit: int = 100) -> list:
+        """Eventos más recientes primero, filtrados por cámara, clase y rango de tiempo."""
+        return self.page(limit=limit, camera=camera, label=label, since=since, until=until)
+
+    @staticmethod
+    def sort_key(event: dict, sort: str = 'started_at') -> tuple:
+        """Clave de un evento para pedir la página siguiente (`after`)."""
+        return tuple(event[col] for col in SORT_KEYS[sort])
+
+    def page(self, sort: str = 'started_at', descending: bool = True, after: tuple = None,
+             limit: int = 200, camera: str = None, label: str = None, since: float = None,
+             until: float = None) -> list:
+        """
+        Una página de eventos por paginación por clave (keyset): `after` es la
+        `sort_key` de la última fila de la página anterior. A diferencia de
+        OFFSET, el costo no crece con la profundidad de la página.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Orden desconocido: {sort}. Opciones: {', '.join(SORT_KEYS)}")
+        keys = SORT_KEYS[sort]
+        clauses, params = self._where(camera, label, since, until)
+        if after is not None:
+            p = self.backend.param
+            op = '<' if descending else '>'
+            clauses.append(f"({', '.join(keys)}) {op} ({', '.join([p] * len(keys))})")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        direction = 'DESC' if descending else 'ASC'
+        order = ', '.join(f"{col} {direction}" for col in keys)
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM events {where}"
+               f"ORDER BY {order} LIMIT {int(limit)}")
+        return self._fetch(sql, params)
+
+    def count(self, camera: str = None, label: str = None, since: float = None,
+              until: float = None) -> int:
+        clauses, params = self._where(camera, label, since, until)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.backend.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT COUNT(*) FROM events{where}", params)
+            value = cur.fetchone()[0]
+            conn.commit()
+        return value
+
+    def stats(self) -> dict:
+        return {
+            'inserted': self.inserted,
+            'pending': len(self._pending),
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# encabezado -> (campo del evento, orden en la base o None si no se puede ordenar)
+COLUMNS = [
+    ("Fecha", 'started_at', 'started_at'),
+    ("Cámara", 'camera', 'camera'),
+    ("Severidad", 'label', 'label'),
+    ("Confianza", 'peak_confidence', None),
+    ("Clip", 'clip_path', None),
+]
+
+
+class RegistrosTableModel(QAbstractTableModel):
+    """
+    Modelo de `registrosTable` que carga los eventos por páginas.
+
+    La vista pide más filas con canFetchMore/fetchMore al acercarse al final;
+    cada página sale de EventStore.page (paginación por clave, ordenada y
+    filtrada en la base sobre columnas indexadas). Apenas se agrega una página
+    se pide la siguiente en segundo plano, así el desplazamiento no espera a
+    la base. Solo se guardan en memoria las filas ya recorridas.
+    """
+
+    def __init__(self, store, page_size: int = 200, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.page_size = page_size
+        self.sort_field = 'started_at'
+        self.descending = True
+        self.filters = {}
+
+        self._rows = []
+        self._exhausted = False
+        self._generation = 0  # invalida las páginas pedidas antes de un cambio de orden/filtro
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registros")
+        self._next = None
+        self._prefetch()
+
+    # -- consultas ---------------------------------------------------------------
+
+    def _query(self, after):
+        return self.store.page(self.sort_field, self.descending, after, self.page_size,
+                               **self.filters)
+
+    def _prefetch(self):
+        after = self.store.sort_key(self._rows[-1], self.sort_field) if self._rows else None
+        self._next = (self._generation, self._executor.submit(self._query, after))
+
+    def refresh(self):
+        """Vuelve a cargar desde la primera página (p. ej. al agregarse eventos)."""
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self._generation += 1
+        self.endResetModel()
+        self._prefetch()
+
+    def set_filter(self, camera: str = None, label: str = None, since: float = None,
+                   until: float = None):
+        """Filtra por cámara, severidad y rango de fechas (segundos epoch)."""
+        self.filters = {k: v for k, v in dict(camera=camera, label=label, since=since,
+                                              until=until).items() if v is not None}
+        self.refresh()
+
+    def event_at(self, row: int):
+        """Evento completo (dict) de una fila, para la página de detalles."""
+        return self._rows[row] if 0 <= row < len(self._rows) else None
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    # -- QAbstractTableModel -----------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        event = self._rows[index.row()]
+        field = COLUMNS[index.column()][1]
+        value = event[field]
+        if role == Qt.DisplayRole:
+            if field == 'started_at':
+                return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+            if field == 'peak_confidence':
+                return f"{value:.2f}"
+            if field == 'clip_path':
+                return os.path.basename(value) if value else ""
+            return str(value)
+        if role == Qt.ToolTipRole and field == 'clip_path':
+            return value
+        if role == Qt.UserRole:
+            return event
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        generation, future = self._next
+        try:
+            rows = future.result() if generation == self._generation else self._query(
+                self.store.sort_key(self._rows[-1], self.sort_field) if self._rows else None)
+        except Exception as e:
+            print(f"Error al cargar registros: {e}")
+            self._exhausted = True  # se reintenta con refresh()
+            return
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        if not self._exhausted:
+            self._prefetch()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        field = COLUMNS[column][2]
+        if field is None:
+            return  # solo se ordena por columnas indexadas
+        self.sort_field = field
+        self.descending = order == Qt.DescendingOrder
+        self.refresh()
@@ -43,6 +43,7 @@ def main():
         )
         print(f"Procesando video: {video_path}")
         detector.detect_from_video(video_path)
+        detector.close()  # termina de escribir los snapshots pendientes
     except FileNotFoundError as e:
         print(f"No se encontró el archivo: {e}")
     except RuntimeError as e:
@@ -1,12 +1,17 @@
 import sys
 import os
-import cv2
 from datetime import datetime
+from PyQt5.QtCore import QThread, Qt
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox
-from PyQt5.QtGui import QPixmap, QImage
 from gui.interfaz import Ui_MainWindow
-from traffic_accident_detector.detector import AccidentDetector
+from gui.registros_model import RegistrosTableModel
+from db.events import EventStore
+from traffic_accident_detector.clip_index import load_clip_index, peak_frame, thumbnail, thumbs_path
+from traffic_accident_detector.preview import PreviewThrottle
+from traffic_accident_detector.qt_worker import DetectionWorker
+from traffic_accident_detector.sinks import frame_to_pixmap
 from traffic_accident_detector.utils.file_system import ensure_output_folder_exists
+from traffic_accident_detector.utils.notifier import NotificationDispatcher
 from PyQt5 import QtWidgets, QtWebEngineWidgets, uic
 
 # Función que se ejecuta cuando se detecta un accidente
@@ -25,6 +30,34 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Conectar botones
         self.seleccionarVideoBtn.clicked.connect(self.select_video)
         self.subirVideoBtn.clicked.connect(self.process_video)
+        self.cancelarSubidaBtn.clicked.connect(self.cancel_processing)
+        self.cancelarSubidaBtn.setEnabled(False)
+        self.verDetallesRegistroBtn.clicked.connect(self.show_event_details)
+
+        self.worker = None
+        self.worker_thread = None
+        self.processing_failed = False
+
+        # registro de eventos (SQLite por defecto, ver db/config.py)
+        try:
+            self.event_store = EventStore()
+        except Exception as e:
+            print(f"No se pudo abrir la base de eventos: {e}")
+            self.event_store = None
+
+        # tabla de registros paginada sobre la base de eventos
+        if self.event_store is not None:
+            self.registros_model = RegistrosTableModel(self.event_store, parent=self)
+            self.registrosTable.setModel(self.registros_model)
+            self.registrosTable.setSortingEnabled(True)
+            self.registrosTable.sortByColumn(0, Qt.DescendingOrder)
+
+        # vista previa compartida (video subido y las cuatro cámaras): FPS y tamaño limitados
+        self.preview = PreviewThrottle(fps=15.0)
+
+        # alertas por correo en segundo plano (ALERT_TO, SMTP_HOST, SMTP_USER, ...)
+        self.notifier = NotificationDispatcher.from_env()
+        self.video_path = None
 
     def select_video(self):
         video_path, _ = QFileDialog.getOpenFileName(self, "Seleccionar Video", "", "Archivos de Video (*.mp4 *.avi)")
@@ -34,6 +67,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.archivoSeleccionadoLabel.setText("Ningún archivo seleccionado")
 
     def process_video(self):
+        if self.worker is not None:
+            QMessageBox.warning(self, "Error", "Ya hay un video en proceso.")
+            return
+
         video_path = self.archivoSeleccionadoLabel.text().split(":")[-1].strip()
         if not video_path or video_path == "Ningún archivo seleccionado":
             QMessageBox.warning(self, "Error", "Por favor selecciona un archivo de video primero.")
@@ -45,54 +82,126 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
 
         ensure_output_folder_exists(output_folder)
+        print(f"Procesando video: {video_path}")
+        self.video_path = video_path
+
+        # el procesamiento corre en un QThread; la interfaz solo recibe señales
+        self.preview.set_size('video', (self.vistaPreviaVideo.width(), self.vistaPreviaVideo.height()))
+        self.worker = DetectionWorker(video_path, output_folder, self.preview, 'video',
+                                      save_clips=True,
+                                      pre_roll_seconds=self.grabarAnteriorSpin.value(),
+                                      clip_format=self.formatoVideoCombo.currentText(),
+                                      clip_max_seconds=self.tiempoGrabacionSpin.value(),
+                                      event_store=self.event_store,
+                                      checkpoint_interval=30.0)  # reanudar si se cierra a mitad
+        self.worker_thread = QThread(self)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.frameReady.connect(self.show_frame)
+        self.worker.detectionChanged.connect(self.show_detection)
+        self.worker.progress.connect(self.show_progress)
+        self.worker.accidentDetected.connect(self.accident_detected)
+        self.worker.clipSaved.connect(self.clip_saved)
+        self.worker.failed.connect(self.show_error)
+        self.worker.finished.connect(self.processing_finished)
+
+        self.processing_failed = False
+        self.subirVideoBtn.setEnabled(False)
+        self.cancelarSubidaBtn.setEnabled(True)
+        self.deteccionEjemplo.setText("✅ Sin accidentes detectados")
+        self.statusBar.showMessage("Cargando modelo...")
+        self.worker_thread.start()
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.statusBar.showMessage("Cancelando...")
+
+    def show_frame(self):
+        frame = self.worker.take_frame() if self.worker is not None else None
+        if frame is not None:
+            self.vistaPreviaVideo.setPixmap(frame_to_pixmap(frame))
+
+    def show_detection(self, is_severe: bool):
+        if is_severe:
+            self.deteccionEjemplo.setText("🚨 ¡Accidente Detectado!")
+        else:
+            self.deteccionEjemplo.setText("✅ Sin accidentes detectados")
 
-        try:
-            detector = AccidentDetector(
-                save_clips=True,
-                output_dir=output_folder,
-                callback=on_accident
-            )
-            print(f"Procesando video: {video_path}")
-
-            cap = cv2.VideoCapture(video_path)
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                results = detector.model(frame)[0]
-                annotated_frame = frame.copy()
-                deteccion_en_frame = False
-
-                for box, conf, cls in zip(results.boxes.xyxy, results.boxes.conf, results.boxes.cls):
-                    class_name = str(detector.model.names[int(cls)])
-                    if conf >= detector.confidence_threshold and class_name in detector.target_labels:
-                        x1, y1, x2, y2 = map(int, box)
-                        label = f"Accidente {conf:.2f}"
-                        color = (0, 0, 255)
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                        cv2.putText(annotated_frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                        deteccion_en_frame = True
-
-                # Convertir y mostrar en QLabel
-                height, width, channel = annotated_frame.shape
-                bytes_per_line = 3 * width
-                q_img = QImage(annotated_frame.data, width, height, bytes_per_line, QImage.Format_BGR888)
-                self.vistaPreviaVideo.setPixmap(QPixmap.fromImage(q_img))
-
-                # Actualizar mensaje de detección
-                if deteccion_en_frame:
-                    self.deteccionEjemplo.setText("🚨 ¡Accidente Detectado!")
-                else:
-                    self.deteccionEjemplo.setText("✅ Sin accidentes detectados")
-
-                cv2.waitKey(1)
-
-            cap.release()
+    def show_progress(self, frames: int, total: int):
+        if total:
+            self.statusBar.showMessage(f"Procesando: {frames}/{total} frames ({frames * 100 // total}%)")
+        else:
+            self.statusBar.showMessage(f"Procesando: {frames} frames")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Ocurrió un error al procesar el video: {str(e)}")
+    def accident_detected(self, path: str):
+        on_accident(path)
+
+    def clip_saved(self, path: str):
+        if self.notifier is not None and self.notificacionesCheck.isChecked():
+            # solo encola; el clip ya está cerrado, así que su miniatura existe
+            self.notifier.notify(os.path.basename(self.video_path), f"Video guardado en: {path}",
+                                 attachments=[thumbs_path(path)])
+
+    def show_error(self, message: str):
+        self.processing_failed = True
+        QMessageBox.critical(self, "Error", f"Ocurrió un error al procesar el video: {message}")
+
+    def processing_finished(self, cancelled: bool):
+        if self.processing_failed:
+            self.statusBar.showMessage("Procesamiento interrumpido por un error.")
+        else:
+            self.statusBar.showMessage("Procesamiento cancelado." if cancelled else "Procesamiento terminado.")
+        self.subirVideoBtn.setEnabled(True)
+        self.cancelarSubidaBtn.setEnabled(False)
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.deleteLater()
+        self.worker_thread.deleteLater()
+        self.worker = None
+        self.worker_thread = None
+        if self.event_store is not None:
+            self.event_store.flush(timeout=1.0)  # los eventos del video recién procesado
+            self.registros_model.refresh()
+
+    def show_event_details(self):
+        if self.event_store is None:
+            return
+        row = self.registrosTable.currentIndex()
+        event = self.registros_model.event_at(row.row()) if row.isValid() else None
+        if event is None:
+            QMessageBox.warning(self, "Error", "Selecciona un registro primero.")
+            return
+
+        clip_path = event['clip_path'] or ""
+        self.fechaValor.setText(datetime.fromtimestamp(event['started_at']).strftime('%Y-%m-%d %H:%M:%S'))
+        self.archivoValor.setText(clip_path)
+        self.localizacionValor.setText(event['camera'])
+        description = f"{event['label']} (confianza máxima {event['peak_confidence']:.2f})"
+
+        # vista previa desde el índice del clip, sin abrir ni decodificar el video
+        index = load_clip_index(clip_path) if clip_path else None
+        thumb = thumbnail(clip_path, index) if index else None
+        if thumb is not None:
+            self.videoLabel.setPixmap(frame_to_pixmap(thumb))
+            description += f" — momento del incidente: {peak_frame(index) / index['fps']:.1f} s"
+        else:
+            self.videoLabel.setText("Sin vista previa")
+        self.descripcionValor.setText(description)
+        self.stackedWidget.setCurrentWidget(self.detallesRegistroPage)
+
+    def closeEvent(self, event):
+        # no dejar el hilo de procesamiento vivo al cerrar la ventana
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        if self.event_store is not None:
+            self.registros_model.close()
+            self.event_store.close(timeout=5)
+        if self.notifier is not None:
+            self.notifier.close(timeout=5)
+        super().closeEvent(event)
 
 # Iniciar la aplicación
 app = QApplication(sys.argv)
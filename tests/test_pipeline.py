@@ -0,0 +1,47 @@
+import threading
+import time
+
+from traffic_accident_detector.pipeline import BatchScheduler, StagedPipeline
+
+
+class EndlessCapture:
+    """
+    Fuente que nunca termina (como una cámara), con la interfaz de
+    cv2.VideoCapture. Decodifica más lento de lo que se infiere, así la etapa
+    de inferencia queda esperando frames con la cola vacía.
+    """
+
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.n = 0
+
+    def read(self):
+        time.sleep(self.delay)
+        self.n += 1
+        return True, self.n
+
+
+def run_and_stop(batch_size, stop_after=20, timeout=5.0):
+    scheduler = BatchScheduler(lambda frames: [f * 10 for f in frames], batch_size, 0.1)
+    pipeline = StagedPipeline(EndlessCapture(), scheduler, queue_size=4).start()
+    seen = []
+    for frame, result, _ in pipeline.results():
+        seen.append((frame, result))
+        if len(seen) >= stop_after:
+            break
+
+    stopper = threading.Thread(target=pipeline.stop, daemon=True)
+    stopper.start()
+    stopper.join(timeout)
+    assert not stopper.is_alive(), "stop() no terminó: el pipeline quedó bloqueado"
+    return seen
+
+
+def test_stop_early_without_pending_batch():
+    seen = run_and_stop(batch_size=1)
+    assert seen == [(i, i * 10) for i in range(1, 21)]
+
+
+def test_stop_early_with_batches():
+    seen = run_and_stop(batch_size=4)
+    assert [frame for frame, _ in seen] == list(range(1, 21))
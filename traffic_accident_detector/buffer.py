@@ -0,0 +1,60 @@
+from collections import deque
+
+import cv2
+
+
+class PreRollBuffer:
+    """
+    Buffer circular de los últimos segundos antes de un accidente.
+
+    Los frames se guardan comprimidos en JPEG en lugar de arreglos BGR completos,
+    y el total queda acotado tanto en cantidad de frames (segundos * fps) como en
+    bytes (`max_bytes`): al superar cualquiera de los dos se descarta el más viejo.
+    """
+
+    def __init__(self, seconds: float, fps: float, jpeg_quality: int = 90,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.max_frames = max(0, int(round(seconds * fps)))
+        self.max_bytes = max_bytes
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+
+        self.frames = deque()
+        self.nbytes = 0
+        self.peak_bytes = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_frames > 0
+
+    def push(self, frame):
+        """Comprime y agrega un frame, descartando los más viejos si hace falta."""
+        if not self.enabled:
+            return
+        ok, buf = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ok:
+            return
+        data = buf.tobytes()
+        self.frames.append(data)
+        self.nbytes += len(data)
+        while self.frames and (len(self.frames) > self.max_frames or self.nbytes > self.max_bytes):
+            self.nbytes -= len(self.frames.popleft())
+        self.peak_bytes = max(self.peak_bytes, self.nbytes)
+
+    def drain(self) -> list:
+        """Retorna los frames guardados (JPEG, del más viejo al más nuevo) y vacía el buffer."""
+        frames = list(self.frames)
+        self.frames.clear()
+        self.nbytes = 0
+        return frames
+
+    def stats(self) -> dict:
+        return {
+            'frames': len(self.frames),
+            'max_frames': self.max_frames,
+            'bytes': self.nbytes,
+            'peak_bytes': self.peak_bytes,
+            'max_bytes': self.max_bytes,
+        }
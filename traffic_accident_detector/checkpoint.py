@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from traffic_accident_detector.clip_index import index_path, thumbs_path
+from traffic_accident_detector.recorder import part_path, segment_path
+
+
+def when_done(futures, fn):
+    """Llama `fn()` cuando terminan todos los futures (en el hilo del último)."""
+    futures = list(futures)
+    if not futures:
+        fn()
+        return
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            fn()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def discard_clip_file(path: str):
+    """Borra un archivo de clip a medio escribir (o no registrado) y sus índices."""
+    for p in (part_path(path), path, index_path(path), thumbs_path(path)):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def discard_clip(path: str):
+    """Borra un clip que el checkpoint no registra, con todos sus segmentos."""
+    index = 0
+    while True:
+        current = segment_path(path, index)
+        if index and not (os.path.exists(current) or os.path.exists(part_path(current))):
+            break
+        discard_clip_file(current)
+        index += 1
+
+
+class Checkpoint:
+    """
+    Punto de reanudación de un video largo, en un JSON dentro de
+    `<carpeta de salida>/.checkpoints/`.
+
+    Guarda la posición (frames ya procesados), el estado 'severe' de la sesión
+    y los incidentes ya emitidos. Solo se guarda sin clip abierto: un incidente
+    queda siempre en un mismo clip. Solo vale para el mismo archivo: si cambia su tamaño o fecha de
+    modificación se ignora. Las escrituras son atómicas (archivo temporal +
+    os.replace) y pueden llegar desde el hilo del codificador; una escritura
+    vieja nunca pisa a una más nueva.
+
+    Los clips abiertos después del último guardado se anotan aparte
+    (`<checkpoint>.open`): si el proceso muere o se detiene con un clip abierto,
+    al reanudar se borran (los .part incompletos y los terminados que se
+    volverían a grabar) y el incidente se graba de nuevo entero, así no hay
+    clips duplicados ni cortados.
+    """
+
+    VERSION = 2
+
+    def __init__(self, video_path: str, output_dir: str, interval: float = 30.0):
+        self.video_path = os.path.abspath(str(video_path))
+        self.interval = interval
+        key = hashlib.sha1(self.video_path.encode('utf-8')).hexdigest()[:12]
+        name = f"{os.path.basename(self.video_path)}.{key}.json"
+        self.path = os.path.join(output_dir, '.checkpoints', name)
+        self.open_path = f"{self.path}.open"
+
+        self._lock = threading.Condition()
+        self._seq = 0          # último pedido de guardado
+        self._written = 0      # último guardado escrito
+        self._pending = 0
+        self._last = time.monotonic()
+        self._open = []        # (pedido vigente al abrir, ruta del clip)
+        self.saves = 0
+
+    def _identity(self) -> dict:
+        st = os.stat(self.video_path)
+        return {'source': self.video_path, 'size': st.st_size, 'mtime': st.st_mtime}
+
+    def load(self):
+        """Estado guardado para este video, o None si no hay o ya no corresponde."""
+        for path in self._read_json(self.open_path) or []:
+            print(f"Descartando clip sin checkpoint: {path}")
+            discard_clip(path)
+        self._write_json(self.open_path, [])
+        state = self._read_json(self.path)
+        if state is None:
+            return None
+        identity = self._identity()
+        if state.get('version') != self.VERSION or any(state.get(k) != v
+                                                        for k, v in identity.items()):
+            print(f"Checkpoint descartado (el video cambió): {self.path}")
+            return None
+        return state
+
+    def due(self) -> bool:
+        """Toca guardar (quien llama espera además a que no haya un clip abierto)."""
+        return time.monotonic() - self._last >= self.interval
+
+    def clip_opened(self, path: str):
+        """Anota un clip recién abierto, antes de que un guardado lo registre."""
+        with self._lock:
+            self._open.append((self._seq, path))
+            self._write_json(self.open_path, [p for _, p in self._open])
+
+    def request(self) -> int:
+        """Número de orden de un guardado; se pide en el hilo que procesa los frames."""
+        with self._lock:
+            self._seq += 1
+            self._pending += 1
+            self._last = time.monotonic()
+            return self._seq
+
+    def save(self, seq: int, state: dict = None):
+        """Escribe el estado del pedido `seq` (None = el pedido falló, no se escribe)."""
+        try:
+            with self._lock:
+                if state is None or seq <= self._written:
+                    return
+                self._write_json(self.path, dict(state, version=self.VERSION, **self._identity()))
+                self._written = seq
+                self.saves += 1
+                # los clips abiertos antes de este pedido ya quedan en el estado
+                self._open = [(s, p) for s, p in self._open if s >= seq]
+                self._write_json(self.open_path, [p for _, p in self._open])
+        except OSError as e:
+            print(f"No se pudo guardar el checkpoint: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._lock.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Espera a que se escriban los guardados pendientes."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._pending == 0, timeout)
+
+    def remove(self):
+        """El video terminó: la próxima corrida empieza de cero."""
+        self.wait()
+        for path in (self.path, self.open_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
@@ -0,0 +1,149 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+def index_path(clip_path: str) -> str:
+    return f"{os.path.splitext(clip_path)[0]}.index.json"
+
+
+def thumbs_path(clip_path: str) -> str:
+    return f"{os.path.splitext(clip_path)[0]}.thumbs.jpg"
+
+
+class ClipIndexBuilder:
+    """
+    Índice lateral de un clip, armado con los mismos frames que se codifican
+    (sin volver a decodificar el archivo).
+
+    Guarda junto al clip:
+      - clip.thumbs.jpg: tira de miniaturas, una cada `thumb_interval` segundos;
+        si pasan de `max_thumbs` se descarta una de cada dos y se duplica el
+        intervalo, así la tira queda acotada en clips largos.
+      - clip.index.json: duración, los `top_peaks` frames con mayor confianza
+        'severe' (destinos de búsqueda con CAP_PROP_POS_FRAMES) y la posición
+        de las miniaturas en la tira.
+    """
+
+    def __init__(self, clip_path: str, fps: float, size, thumb_width: int = 160,
+                 thumb_interval: float = 1.0, max_thumbs: int = 32, top_peaks: int = 5):
+        self.clip_path = clip_path
+        self.fps = fps or 1
+        self.size = tuple(size)
+        self.thumb_width = thumb_width
+        self.thumb_every = max(1, int(round(thumb_interval * self.fps)))
+        self.max_thumbs = max(2, max_thumbs)
+        self.top_peaks = top_peaks
+
+        self.frames = 0
+        self.thumbs = []           # (frame, miniatura BGR)
+        self.peaks = []            # (confianza, frame), los mayores
+        self.first_detection = None
+
+    def add(self, frame, confidence: float = None):
+        n = self.frames
+        if n % self.thumb_every == 0:
+            self._add_thumb(n, frame)
+        if confidence is not None:
+            if self.first_detection is None:
+                self.first_detection = n
+            self.peaks.append((float(confidence), n))
+            if len(self.peaks) > self.top_peaks * 4:
+                self._trim_peaks()
+        self.frames += 1
+
+    def _add_thumb(self, n, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.thumb_width / float(w))
+        thumb = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        self.thumbs.append((n, thumb))
+        if len(self.thumbs) > self.max_thumbs:
+            self.thumbs = self.thumbs[::2]
+            self.thumb_every *= 2
+
+    def _trim_peaks(self):
+        # el frame más temprano gana entre confianzas iguales
+        self.peaks = sorted(self.peaks, key=lambda p: (-p[0], p[1]))[:self.top_peaks]
+
+    def finish(self) -> dict:
+        """Escribe la tira de miniaturas y el JSON; retorna el índice."""
+        self._trim_peaks()
+        thumbs = {}
+        if self.thumbs:
+            strip = np.hstack([t for _, t in self.thumbs])
+            path = thumbs_path(self.clip_path)
+            cv2.imwrite(f"{path}.tmp.jpg", strip, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+            os.replace(f"{path}.tmp.jpg", path)
+            th, tw = self.thumbs[0][1].shape[:2]
+            thumbs = {
+                'path': os.path.basename(path),
+                'width': tw,
+                'height': th,
+                'frames': [n for n, _ in self.thumbs],
+            }
+        index = {
+            'clip': os.path.basename(self.clip_path),
+            'fps': self.fps,
+            'size': list(self.size),
+            'frames': self.frames,
+            'duration': self.frames / float(self.fps),
+            'first_detection_frame': self.first_detection,
+            'peaks': [{'frame': n, 'time': n / float(self.fps), 'confidence': c}
+                      for c, n in self.peaks],
+            'thumbnails': thumbs,
+        }
+        path = index_path(self.clip_path)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(index, f)
+        os.replace(f"{path}.tmp", path)
+        return index
+
+
+def load_clip_index(clip_path: str):
+    """Índice del clip, o None si no tiene (p. ej. clips grabados antes del índice)."""
+    try:
+        with open(index_path(clip_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_frame(index: dict) -> int:
+    """Frame del momento del incidente: la mayor confianza, o la primera detección."""
+    if index.get('peaks'):
+        return index['peaks'][0]['frame']
+    return index.get('first_detection_frame') or 0
+
+
+def thumbnail(clip_path: str, index: dict, frame: int = None):
+    """
+    Miniatura (BGR) más cercana al frame indicado (por defecto el pico), recortada
+    de la tira sin abrir el video. None si el clip no tiene miniaturas.
+    """
+    thumbs = index.get('thumbnails') or {}
+    if not thumbs.get('frames'):
+        return None
+    strip = cv2.imread(os.path.join(os.path.dirname(clip_path), thumbs['path']))
+    if strip is None:
+        return None
+    target = peak_frame(index) if frame is None else frame
+    i = int(np.argmin([abs(n - target) for n in thumbs['frames']]))
+    w = thumbs['width']
+    return strip[:, i * w:(i + 1) * w]
+
+
+def open_at(clip_path: str, frame: int = None, index: dict = None):
+    """
+    Abre el clip ya posicionado en `frame` (por defecto el pico del índice),
+    sin recorrer el archivo desde el principio.
+    """
+    if frame is None:
+        index = index or load_clip_index(clip_path) or {}
+        frame = peak_frame(index)
+    cap = cv2.VideoCapture(clip_path)
+    if frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    return cap
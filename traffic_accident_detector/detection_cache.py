@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from traffic_accident_detector.postprocess import to_numpy
+
+VERSION = 1
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 del contenido de un archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TimelineBuilder:
+    """
+    Junta las detecciones crudas de cada frame en la misma línea de tiempo
+    columnar que usa sharding.py: `offsets[i]:offsets[i+1]` son las cajas del
+    frame i dentro de `boxes`/`confs`/`clss`.
+    """
+
+    def __init__(self):
+        self.boxes, self.confs, self.clss, self.counts = [], [], [], []
+
+    def add(self, boxes, confs, clss):
+        self.boxes.append(to_numpy(boxes, np.float32).reshape(-1, 4))
+        self.confs.append(to_numpy(confs, np.float32).reshape(-1))
+        self.clss.append(to_numpy(clss, np.int16).reshape(-1))
+        self.counts.append(len(self.confs[-1]))
+
+    def build(self) -> dict:
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        return {
+            'frames': len(self.counts),
+            'offsets': offsets,
+            'boxes': np.concatenate(self.boxes) if self.boxes else np.zeros((0, 4), np.float32),
+            'confs': np.concatenate(self.confs) if self.confs else np.zeros(0, np.float32),
+            'clss': np.concatenate(self.clss) if self.clss else np.zeros(0, np.int16),
+        }
+
+
+class CachedBoxes:
+    """Las cajas de un frame del caché, con los atributos de `res.boxes` de YOLO."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+
+class CachedResult:
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = CachedBoxes(xyxy, conf, cls)
+
+
+class DetectionCache:
+    """
+    Caché en disco de las detecciones crudas de un video, en un .npz columnar
+    por clave (ver TimelineBuilder).
+
+    La clave combina el hash del contenido del video, el hash de los pesos del
+    modelo, el tamaño de imagen y el backend: si coinciden, la salida del modelo
+    es la misma y se puede volver a correr la lógica (umbral de confianza,
+    conteo 'severe', clips) sin inferir. Se guardan las cajas tal como salen del
+    modelo, así que sirve para cualquier `confidence_threshold` mayor o igual al
+    umbral interno del predictor.
+
+    Los hashes de archivos se recuerdan en `hashes.json` por ruta, tamaño y
+    fecha de modificación, para no releer videos grandes en cada corrida.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._memo_path = os.path.join(directory, 'hashes.json')
+        self._lock = threading.Lock()
+
+    def content_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime]
+        with self._lock:
+            memo = self._read_memo()
+            entry = memo.get(path)
+            if entry and entry[:2] == stamp:
+                return entry[2]
+        digest = file_hash(path)
+        with self._lock:
+            memo = self._read_memo()
+            memo[path] = stamp + [digest]
+            tmp = f"{self._memo_path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(memo, f)
+            os.replace(tmp, self._memo_path)
+        return digest
+
+    def _read_memo(self) -> dict:
+        try:
+            with open(self._memo_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def key(self, video_path: str, model_path: str, imgsz, backend: str = 'torch',
+            int8: bool = False) -> str:
+        parts = [self.content_hash(video_path), self.content_hash(model_path), str(imgsz),
+                 backend, 'int8' if int8 else 'fp', f"v{VERSION}"]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key: str):
+        """Línea de tiempo guardada para la clave, o None."""
+        try:
+            with np.load(self.path(key)) as data:
+                timeline = {name: data[name] for name in ('offsets', 'boxes', 'confs', 'clss')}
+                meta = json.loads(str(data['meta']))
+        except (OSError, ValueError, KeyError):
+            return None
+        timeline['frames'] = len(timeline['offsets']) - 1
+        timeline['meta'] = meta
+        return timeline
+
+    def save(self, key: str, timeline: dict, **meta):
+        tmp = f"{self.path(key)}.tmp.npz"
+        np.savez(tmp, offsets=timeline['offsets'], boxes=timeline['boxes'],
+                 confs=timeline['confs'], clss=timeline['clss'],
+                 meta=np.array(json.dumps(dict(meta, version=VERSION, frames=timeline['frames']))))
+        os.replace(tmp, self.path(key))
@@ -1,27 +1,96 @@
+import asyncio
 import os
 import cv2
+import numpy as np
 import torch
 import random
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
-from traffic_accident_detector.models.loader import load_model, select_model_file
-from PyQt5.QtGui import QImage, QPixmap
+from traffic_accident_detector.buffer import PreRollBuffer
+from traffic_accident_detector.models.loader import get_registry, load_model, select_model_file
+from traffic_accident_detector.pipeline import BatchScheduler, StagedPipeline
+from traffic_accident_detector.postprocess import PostProcessor, to_numpy, yolo_rows, yolo_text
+from traffic_accident_detector.preview import PreviewThrottle
+from traffic_accident_detector.checkpoint import Checkpoint, when_done
+from traffic_accident_detector.detection_cache import CachedResult, DetectionCache, TimelineBuilder
+from traffic_accident_detector.recorder import ClipRecorder, clip_extension, reserve_path
+from traffic_accident_detector.motion import MotionGate
+from traffic_accident_detector.sampling import AdaptiveStride
+from traffic_accident_detector.sinks import QtPreviewSink, WindowSink, frame_to_pixmap
+from traffic_accident_detector.stream import LatestFrameGrabber, is_live_source, open_source
+from traffic_accident_detector.utils.snapshot_writer import SnapshotWriter
 
 class AccidentDetector:
     def __init__(self,
                  model_path: str = None,
+                 model=None,                       # modelo ya cargado (en vez de model_path)
                  save_clips: bool = True,                  # <–– lo re‑agregamos
                  output_dir: str = 'detected_clips',
                  callback=None,
+                 clip_saved_callback=None,         # recibe la ruta del clip cuando quedó escrito
                  consecutive_threshold: int = 10,
                  confidence_threshold: float = 0.5,
                  snapshot_cooldown: float = 5.0,   # segundos entre snapshots
+                 snapshot_quality: int = 95,       # calidad JPEG de los snapshots del dataset
+                 snapshot_queue: int = 16,         # snapshots pendientes de escribir en disco
                  device: str = "auto",
+                 backend: str = "torch",           # 'torch', 'onnx' u 'openvino'
+                 int8: bool = False,               # cuantización INT8 del backend exportado
+                 shared_model: bool = True,        # usar el registro de modelos del proceso
                  update_label_callback=None,
-                 retrain_dir: str = r'C:\Users\jhonr\Desktop\proyecto_deteccion\yolov8'):
-
-        if model_path is None:
-            model_path = select_model_file()
-        self.model = load_model(model_path, device)
+                 batch_size: int = 1,              # frames por pasada del modelo
+                 batch_timeout: float = 0.1,       # espera máxima (s) para llenar un lote
+                 pipelined: bool = False,          # decodificar/inferir/escribir en etapas
+                 queue_size: int = 8,              # capacidad de cada cola del pipeline
+                 latest_frame: bool = True,        # fuentes en vivo: procesar siempre el frame más nuevo
+                 frame_stride: int = 1,            # inferir 1 de cada N frames sin 'severe'
+                 consecutive_seconds: float = None,  # umbral en segundos en vez de frames
+                 motion_gate: bool = False,        # omitir inferencia en escenas estáticas
+                 motion_threshold: float = 0.005,  # fracción mínima de píxeles que cambian
+                 motion_roi=None,                  # (x, y, w, h) a vigilar; None = frame completo
+                 motion_method: str = 'diff',      # 'diff' o 'mog2'
+                 keyframe_interval: int = 50,      # inferir al menos cada N frames
+                 pre_roll_seconds: float = 0.0,    # segundos previos al accidente en el clip
+                 pre_roll_max_mb: float = 64.0,    # memoria máxima del buffer previo por fuente
+                 pre_roll_quality: int = 90,       # calidad JPEG del buffer previo
+                 clip_format: str = 'MP4',         # 'MP4', 'AVI' o 'MKV' (formatoVideoCombo)
+                 clip_max_seconds: float = None,   # duración máxima de cada archivo del clip
+                 encoder_queue: int = 32,          # frames pendientes del codificador de clips
+                 clip_index: bool = True,          # miniaturas e índice de búsqueda junto a cada clip
+                 sinks=None,                       # destinos de frames (ver sinks.py)
+                 preview_fps: float = 15.0,        # cuadros por segundo de la vista previa Qt
+                 preview_size=(640, 360),          # tamaño máximo de la vista previa Qt
+                 preview=None,                     # PreviewThrottle compartido (p. ej. entre cámaras)
+                 headless: bool = False,           # sin ventana ni vista previa por defecto
+                 metrics=None,                     # medición por etapa (ver metrics.py)
+                 event_store=None,                 # repositorio de eventos (ver db/events.py)
+                 checkpoint_interval: float = None,  # segundos entre checkpoints para reanudar (None = no)
+                 detection_cache: str = None,      # carpeta del caché de detecciones crudas (None = no)
+                 retrain_dir: str = None):         # dataset para snapshots de reentrenamiento (None = no)
+
+        if model is not None:
+            self.model = model
+            self.model_lock = threading.Lock()
+        # por defecto el modelo sale del registro compartido: no se recarga en cada instancia
+        elif shared_model:
+            if model_path is None:
+                model_path = select_model_file()
+            # modelo y lock juntos: el registro no lo libera mientras este detector lo use
+            self.model, self.model_lock = get_registry().acquire(model_path, device, backend, int8)
+        else:
+            if model_path is None:
+                model_path = select_model_file()
+            self.model = load_model(model_path, device, backend, int8)
+            self.model_lock = threading.Lock()
+        self.shared_model = model is None and shared_model
+        self.model_path = model_path
+        self.device = device
+        self.backend = backend
+        self.int8 = int8
+        # tamaño de imagen con el que infiere el modelo (parte de la clave del caché)
+        self.imgsz = (getattr(self.model, 'overrides', None) or {}).get('imgsz') or 640
 
         # aunque ahora no lo usemos para nada, evitamos el TypeError
         self.save_clips = save_clips
@@ -30,13 +99,14 @@ class AccidentDetector:
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # Carpetas para GUARDAR snapshots full-frame + .txt YOLO
+        # Carpetas para GUARDAR snapshots full-frame + .txt YOLO (solo si se pidió)
         self.retrain_dir = retrain_dir
-        for subset in ['train', 'valid', 'test']:
+        for subset in (['train', 'valid', 'test'] if retrain_dir else []):
             os.makedirs(os.path.join(self.retrain_dir, subset, 'images'), exist_ok=True)
             os.makedirs(os.path.join(self.retrain_dir, subset, 'labels'), exist_ok=True)
 
         self.callback = callback
+        self.clip_saved_callback = clip_saved_callback
         self.update_label_callback = update_label_callback
 
         self.consecutive_threshold = consecutive_threshold
@@ -44,15 +114,108 @@ class AccidentDetector:
 
         # clases que nos interesan
         self.target_labels = {'Accident', 'NoAccident', 'moderate', 'severe'}
+        # índices de clase precalculados para filtrar con máscaras
+        self.postprocess = PostProcessor(self.model.names, self.target_labels)
 
         # snapshot throttle
         self.snapshot_cooldown = timedelta(seconds=snapshot_cooldown)
         self.last_snapshot_time = None
+        self.snapshot_quality = snapshot_quality
+        self.snapshot_queue = snapshot_queue
+        self.snapshot_writer = None  # se crea con el primer snapshot
+
+        # inferencia por lotes
+        self.batch_size = max(1, int(batch_size))
+        self.batch_timeout = batch_timeout
+
+        # pipeline por etapas
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.pipeline = None
+
+        # cámaras y streams: lector con el último frame y reconexión (ver stream.py)
+        self.latest_frame = latest_frame
+
+        # videos largos: reanudar desde el último checkpoint (ver checkpoint.py)
+        self.checkpoint_interval = checkpoint_interval
+
+        # repetir un video con otros umbrales sin volver a inferir (ver detection_cache.py)
+        self.detection_cache = DetectionCache(detection_cache) if detection_cache else None
+
+        # salto adaptativo de frames
+        self.frame_stride = max(1, int(frame_stride))
+        self.consecutive_seconds = consecutive_seconds
+
+        # compuerta de movimiento
+        self.motion_gate = motion_gate
+        self.motion_threshold = motion_threshold
+        self.motion_roi = motion_roi
+        self.motion_method = motion_method
+        self.keyframe_interval = keyframe_interval
+
+        # buffer previo al accidente
+        self.pre_roll_seconds = pre_roll_seconds
+        self.pre_roll_max_mb = pre_roll_max_mb
+        self.pre_roll_quality = pre_roll_quality
+
+        # vista previa limitada en FPS y tamaño, desacoplada del ritmo de proceso
+        self.preview = preview if preview is not None else PreviewThrottle(preview_fps, preview_size)
+
+        # grabación de clips en un hilo codificador
+        clip_extension(clip_format)  # valida el formato ahora y no al primer accidente
+        self.clip_format = clip_format
+        self.clip_max_seconds = clip_max_seconds
+        self.encoder_queue = encoder_queue
+        self.clip_index = clip_index
+
+        # salidas de frames; headless sin sinks = ningún trabajo de visualización
+        self.sinks = list(sinks) if sinks is not None else self._default_sinks(headless)
+
+        # medición de tiempos por etapa; None = sin costo
+        self.metrics = metrics
+        self.last_run_stats = None
+
+        # cada clip se registra como evento; add() solo encola
+        self.event_store = event_store
+
+    def threshold_frames(self, fps: float) -> int:
+        """
+        Umbral de detecciones 'severe' en frames. Si se configuró en segundos se
+        convierte con los FPS del video, así no depende del salto de inferencia.
+        """
+        if self.consecutive_seconds is None:
+            return self.consecutive_threshold
+        return max(1, int(round(self.consecutive_seconds * fps)))
+
+    def make_gate(self):
+        """
+        Compuerta que decide qué frames van al modelo en una fuente: salto
+        adaptativo y, si está activo, filtro de movimiento por delante.
+        """
+        gate = AdaptiveStride(self.frame_stride)
+        if self.motion_gate:
+            gate = MotionGate(self.motion_threshold, roi=self.motion_roi,
+                              keyframe_interval=self.keyframe_interval,
+                              method=self.motion_method, inner=gate)
+        return gate
 
     def convert_frame_to_pixmap(self, frame):
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        return QPixmap(QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888))
+        if self.metrics is None:
+            return frame_to_pixmap(frame)
+        t0 = time.perf_counter()
+        pixmap = frame_to_pixmap(frame)
+        self.metrics.observe('pixmap', time.perf_counter() - t0)
+        return pixmap
+
+    def _default_sinks(self, headless: bool):
+        """Vista previa Qt (si hay callback) y ventana de OpenCV, salvo en modo headless."""
+        sinks = []
+        if self.update_label_callback:
+            sinks.append(QtPreviewSink(self.update_label_callback, self.convert_frame_to_pixmap,
+                                       self.preview))
+        if not headless:
+            sinks.append(WindowSink())
+        return sinks
 
     def choose_dataset_folder(self):
         r = random.random()
@@ -64,14 +227,24 @@ class AccidentDetector:
             return 'test'
 
     def save_snapshot(self, frame, boxes, confs, cls_idxs):
-        """Guarda full-frame + .txt YOLO en train/valid/test solo para target_labels."""
+        """
+        Encola full-frame + .txt YOLO en train/valid/test solo para target_labels.
+        La escritura a disco la hace el SnapshotWriter en segundo plano. Sin
+        `retrain_dir` no se guarda nada.
+        """
+        if not self.retrain_dir:
+            return None
         now = datetime.now()
         if self.last_snapshot_time and now - self.last_snapshot_time < self.snapshot_cooldown:
-            return  # aún en cooldown
+            return None  # aún en cooldown
+
+        t0 = time.perf_counter() if self.metrics is not None else 0.0
+        if self.snapshot_writer is None:
+            self.snapshot_writer = SnapshotWriter(self.snapshot_queue, self.snapshot_quality,
+                                                  metrics=self.metrics)
 
         h, w = frame.shape[:2]
-        ts = now.strftime('%Y%m%d_%H%M%S')
-        base = ts
+        base = self.snapshot_writer.unique_name(now)
         img_name = f"{base}.jpg"
         lbl_name = f"{base}.txt"
 
@@ -79,111 +252,545 @@ class AccidentDetector:
         img_path = os.path.join(self.retrain_dir, subset, 'images', img_name)
         lbl_path = os.path.join(self.retrain_dir, subset, 'labels', lbl_name)
 
-        # guardar imagen completa
-        cv2.imwrite(img_path, frame)
-
-        # guardar cada caja en formato YOLO
-        with open(lbl_path, 'w') as f:
-            for box, conf, cls in zip(boxes, confs, cls_idxs):
-                cls_int = int(cls)
-                name = self.model.names[cls_int]
-                if conf < self.confidence_threshold or name not in self.target_labels:
-                    continue
-                x1, y1, x2, y2 = map(int, box)
-                xc = (x1 + x2) / 2 / w
-                yc = (y1 + y2) / 2 / h
-                bw = (x2 - x1) / w
-                bh = (y2 - y1) / h
-                f.write(f"{cls_int} {xc:.6f} {yc:.6f} {bw:.6f} {bh:.6f}\n")
+        # cajas de target_labels en formato YOLO
+        boxes, _, cls_idxs = self.postprocess.target_boxes(boxes, confs, cls_idxs,
+                                                           self.confidence_threshold)
+        label_text = yolo_text(yolo_rows(boxes, cls_idxs, w, h))
+
+        queued = self.snapshot_writer.submit(img_path, frame, lbl_path, label_text)
 
         self.last_snapshot_time = now
+        if self.metrics is not None:
+            self.metrics.observe('snapshot', time.perf_counter() - t0)
+            self.metrics.inc('snapshots')
+        if not queued:
+            return None
         print(f"[{subset.upper()}] Snapshot: {img_path}, {lbl_path}")
+        return img_path
+
+    def flush_snapshots(self, timeout: float = None) -> bool:
+        """Espera a que los snapshots encolados queden escritos y sincronizados en disco."""
+        if self.snapshot_writer is None:
+            return True
+        return self.snapshot_writer.flush(timeout)
+
+    def close(self):
+        """Libera los recursos en segundo plano; llamar al cerrar la aplicación."""
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.close()
+            self.snapshot_writer = None
+        if self.shared_model:
+            get_registry().release_user(self.model)
+            self.shared_model = False
+
+    def _infer(self, frames):
+        """Ejecuta una sola pasada del modelo sobre un lote de frames."""
+        t0 = time.perf_counter() if self.metrics is not None else 0.0
+        with self.model_lock:
+            if len(frames) == 1:
+                results = [self.model(frames[0])[0]]
+            else:
+                results = self.model(frames)
+        if self.metrics is not None:
+            self.metrics.observe('inference', time.perf_counter() - t0, len(frames))
+            self.metrics.inc('inferences', len(frames))
+        return results
 
     def detect_from_video(self, video_path: str, user_output_dir: str = None):
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                raise RuntimeError("No se pudo abrir el video")
-
-            fps    = int(cap.get(cv2.CAP_PROP_FPS))
-            w      = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            h      = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-
-            video_dir = user_output_dir or self.output_dir
-            os.makedirs(video_dir, exist_ok=True)
-
-            writer = None
-            recording = False
-            count_severe = 0
-            cooldown_frames = 0
-            title_on = False
+            for _ in self._process(video_path, user_output_dir):
+                pass
+        except Exception as e:
+            print("Error al procesar el video:", e)
 
+    def iter_detections(self, source, user_output_dir: str = None):
+        """
+        Procesa `source` igual que detect_from_video (clips, snapshots, sinks),
+        pero entrega los resultados a medida que salen, sin juntar el video:
+
+          {'type': 'frame', 'frame': n, 'pos': s, 'time': epoch, 'boxes': (N, 4),
+           'confs': (N,), 'clss': (N,), 'severe': bool, 'inferred': bool}
+          {'type': 'incident_start', 'frame': n, 'pos': s, 'time': epoch, 'clip_path': ...}
+          {'type': 'incident_end', 'frame': n, 'pos': s, 'time': epoch, 'clip_path': ...,
+           'peak_confidence': c}
+
+        Las cajas son arrays numpy con todas las clases (sin filtrar por
+        confianza); `inferred` es False si el frame reutilizó el resultado del
+        anterior (salto de frames o compuerta de movimiento). Si el consumidor
+        deja de iterar, la fuente se libera y el clip en curso se cierra.
+        """
+        incidents = deque()
+        frames = self._process(source, user_output_dir, incidents.append)
+        try:
+            for session, res, inferred in frames:
+                while incidents:
+                    yield incidents.popleft()
+                yield {
+                    'type': 'frame',
+                    'frame': session.frame_index,
+                    'pos': session.frame_index / float(session.fps or 1),
+                    'time': time.time(),
+                    'boxes': to_numpy(res.boxes.xyxy, np.float32).reshape(-1, 4),
+                    'confs': to_numpy(res.boxes.conf, np.float32).reshape(-1),
+                    'clss': to_numpy(res.boxes.cls, np.int16).reshape(-1),
+                    'severe': session.last_severe,
+                    'inferred': inferred,
+                }
+            while incidents:
+                yield incidents.popleft()  # el cierre del último clip
+        finally:
+            frames.close()
+
+    async def aiter_detections(self, source, user_output_dir: str = None):
+        """
+        Variante asíncrona de iter_detections: la lectura y la inferencia corren
+        en un hilo, así el event loop no se bloquea entre registros.
+        """
+        frames = self.iter_detections(source, user_output_dir)
+        done = object()
+        loop = asyncio.get_running_loop()
+        pending = None
+        try:
             while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                res = self.model(frame)[0]
-                ann = frame.copy()
-
-                has_target = False
-                is_severe = False
-
-                # dibujar todas las cajas y revisar clases
-                for box, conf, cls in zip(res.boxes.xyxy, res.boxes.conf, res.boxes.cls):
-                    name = self.model.names[int(cls)]
-                    if conf >= self.confidence_threshold and name == 'severe':  # Solo "severe"
-                     x1, y1, x2, y2 = map(int, box)
-                     cv2.rectangle(ann, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                     cv2.putText(ann, f"{name} {conf:.2f}", (x1, y1 - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                     is_severe = True  # Marcar que es un accidente severo
-               
-                if has_target:
-                    self.save_snapshot(frame, res.boxes.xyxy, res.boxes.conf, res.boxes.cls)
-
-                # lógica de vídeo para severe
-                if is_severe:
-                    count_severe += 1
-                else:
-                    count_severe = max(0, count_severe - 1)
-
-                if count_severe >= self.consecutive_threshold and not recording:
-                    recording = True
-                    title_on = False
-                    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    vid_path = os.path.join(video_dir, f"accidente_severe_{ts}.mp4")
-                    writer = cv2.VideoWriter(vid_path, fourcc, fps, (w, h))
-                    print("Grabando video (severe) en:", vid_path)
-                    if self.callback:
-                        self.callback(vid_path)
-
-                if recording:
-                    if not title_on:
-                        cv2.putText(ann, "ACCIDENTE SEVERE", (50,50),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0,0,255), 5, cv2.LINE_AA)
-                        title_on = True
-                    writer.write(ann)
-                    cooldown_frames += 1
-                    if count_severe == 0 and cooldown_frames > fps * 2:
-                        recording = False
-                        cooldown_frames = 0
-                        writer.release()
-                        writer = None
-                        print("Finalizada grabación severe.")
-
-                if self.update_label_callback:
-                    self.update_label_callback(self.convert_frame_to_pixmap(ann))
-
-                cv2.imshow("Detección de Accidentes", ann)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                # shield: si cancelan la tarea, el `next` en curso sigue en su hilo
+                pending = loop.run_in_executor(None, next, frames, done)
+                record = await asyncio.shield(pending)
+                pending = None
+                if record is done:
+                    return
+                yield record
+        finally:
+            if pending is not None:
+                # el generador no se puede cerrar mientras `next` se ejecuta
+                try:
+                    await pending
+                except Exception:
+                    pass
+            await asyncio.to_thread(frames.close)
+
+    def _process(self, video_path, user_output_dir: str = None, on_incident=None):
+        """Recorre la fuente; genera (sesión, resultado, inferido) tras procesar cada frame."""
+        cap = open_source(video_path, self.latest_frame, self.metrics)
+        if not cap.isOpened():
+            cap.release()
+            raise RuntimeError("No se pudo abrir el video")
+
+        fps    = int(cap.get(cv2.CAP_PROP_FPS))
+        w      = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h      = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        video_dir = user_output_dir or self.output_dir
+        os.makedirs(video_dir, exist_ok=True)
+
+        # archivos: seguir desde el último checkpoint sin volver a inferir lo ya procesado
+        checkpoint = None
+        if self.checkpoint_interval is not None and not is_live_source(video_path):
+            checkpoint = Checkpoint(video_path, video_dir, self.checkpoint_interval)
+
+        gate = self.make_gate()
+        session = DetectionSession(self, video_dir, fps, (w, h), gate,
+                                   camera=os.path.basename(str(video_path)),
+                                   on_incident=on_incident, checkpoint=checkpoint)
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, state['frame'])
+            session.restore(state)
+            print(f"Reanudando desde el frame {state['frame']} "
+                  f"({len(state['incidents'])} incidentes previos)")
+
+        scheduler = BatchScheduler(self._infer, self.batch_size, self.batch_timeout, gate)
+
+        # mismo video, pesos y tamaño de imagen: las detecciones salen del caché
+        cache_key = timeline = builder = None
+        if self.detection_cache is not None and self.model_path and not is_live_source(video_path):
+            cache_key = self.detection_cache.key(video_path, self.model_path, self.imgsz,
+                                                 self.backend, self.int8)
+            timeline = self.detection_cache.load(cache_key)
+            if timeline is None and state is None:
+                builder = TimelineBuilder()  # se guarda solo si se infiere el video completo
+
+        started = time.monotonic()
+        if timeline is not None:
+            print(f"Detecciones desde el caché ({timeline['frames']} frames), sin inferir")
+            results = self._replay(cap, scheduler, timeline, session.frame_index + 1)
+        else:
+            results = self._results(cap, scheduler)
+        finished = False
+        try:
+            # el estado "severe" se alimenta en el orden original de los frames
+            for frame, res, inferred in results:
+                if builder is not None:
+                    if inferred:
+                        builder.add(res.boxes.xyxy, res.boxes.conf, res.boxes.cls)
+                    else:
+                        builder = None  # frames sin inferir (salto/compuerta): no se guarda
+                keep_going = session.process(frame, res.boxes.xyxy, res.boxes.conf, res.boxes.cls)
+                # con un clip abierto se espera a que cierre: guardar lo cortaría
+                if checkpoint is not None and not session.recording and checkpoint.due():
+                    session.save_checkpoint()
+                yield session, res, inferred
+                if not keep_going:
                     break
-
+            else:
+                finished = True
+                if builder is not None:
+                    self.detection_cache.save(cache_key, builder.build(),
+                                              source=os.path.basename(str(video_path)),
+                                              model=os.path.basename(self.model_path),
+                                              imgsz=self.imgsz, fps=fps)
+        finally:
+            results.close()
             cap.release()
-            if writer:
-                writer.release()
-            cv2.destroyAllWindows()
-
-        except Exception as e:
-            print("Error al procesar el video:", e)
+            if checkpoint is not None and not finished:
+                session.save_checkpoint(suspend=True)  # detenido a mitad: se puede reanudar
+            session.close()
+            for sink in self.sinks:
+                sink.close()
+            self.flush_snapshots()
+            if checkpoint is not None:
+                if finished:
+                    checkpoint.remove()
+                else:
+                    checkpoint.wait()
+        self._report_run(scheduler, session, time.monotonic() - started)
+        if isinstance(cap, LatestFrameGrabber):
+            stream = self.last_run_stats['stream'] = cap.stats()
+            print(f"Stream: {stream['dropped']} frames descartados, "
+                  f"{stream['reconnects']} reconexiones, "
+                  f"antigüedad media {stream['avg_age_ms']:.0f} ms")
+
+    def _replay(self, cap, scheduler, timeline, start: int = 0):
+        """Genera (frame, resultado, inferido) con las detecciones del caché, sin el modelo."""
+        metrics = self.metrics
+        offsets = timeline['offsets']
+        for i in range(start, timeline['frames']):
+            ret, frame = cap.read()
+            if not ret:
+                return
+            if metrics is not None:
+                metrics.frame_in()
+            scheduler.frames += 1
+            a, b = offsets[i], offsets[i + 1]
+            yield frame, CachedResult(timeline['boxes'][a:b], timeline['confs'][a:b],
+                                      timeline['clss'][a:b]), True
+
+    def _results(self, cap, scheduler):
+        """Genera (frame, resultado, inferido) en orden, con o sin pipeline por etapas."""
+        if self.pipelined:
+            # decodificación e inferencia en hilos; anotación y escritura en el que consume
+            self.pipeline = StagedPipeline(cap, scheduler, self.queue_size, self.metrics).start()
+            try:
+                yield from self.pipeline.results()
+            finally:
+                self.pipeline.stop()
+                self.pipeline = None
+            return
+
+        # lectura, inferencia y anotación en un solo hilo
+        metrics = self.metrics
+        while True:
+            t0 = time.perf_counter() if metrics is not None else 0.0
+            ret, frame = cap.read()
+            if metrics is not None and ret:
+                metrics.observe('decode', time.perf_counter() - t0)
+                metrics.frame_in()
+            # una sola pasada por lote: lleno, timeout o fin del video
+            yield from scheduler.push(frame) if ret else scheduler.flush()
+            if not ret:
+                return
+
+    def _report_run(self, scheduler, session, elapsed: float):
+        """Guarda y muestra la tasa de inferencia lograda en la última corrida."""
+        frames = scheduler.frames
+        self.last_run_stats = {
+            'frames': frames,
+            'inferences': scheduler.inferences,
+            'inference_rate': scheduler.inferences / frames if frames else 0.0,
+            'inference_fps': scheduler.inferences / elapsed if elapsed > 0 else 0.0,
+            'elapsed': elapsed,
+            'pre_roll': session.pre_roll.stats(),
+        }
+        if isinstance(session.gate, MotionGate):
+            self.last_run_stats['motion'] = session.gate.stats()
+            print(f"Filtro de movimiento: {self.last_run_stats['motion']['skipped_fraction']:.0%} "
+                  f"de frames omitidos")
+        print(f"Inferencia en {scheduler.inferences}/{frames} frames "
+              f"({self.last_run_stats['inference_rate']:.0%}, "
+              f"{self.last_run_stats['inference_fps']:.1f} inferencias/s)")
+
+    def queue_depths(self) -> dict:
+        """Profundidad de las colas del pipeline en curso (vacío si no hay)."""
+        if self.pipeline is None:
+            return {}
+        return self.pipeline.queue_depths()
+
+
+class DetectionSession:
+    """
+    Estado de detección y grabación 'severe' de una fuente de video.
+    Recibe los frames ya inferidos, en orden, y decide cuándo abrir y cerrar el clip.
+    """
+
+    def __init__(self, detector: AccidentDetector, video_dir: str, fps: int, size,
+                 gate=None, sinks=None, callback=None, camera: str = None, on_incident=None,
+                 checkpoint=None):
+        self.detector = detector
+        self.camera = camera or os.path.basename(os.path.normpath(video_dir))
+        # sinks y callback propios (p. ej. por cámara); por defecto los del detector
+        self.sinks = detector.sinks if sinks is None else list(sinks)
+        self.callback = detector.callback if callback is None else callback
+        self.on_incident = on_incident  # recibe los dicts incident_start/incident_end
+        self.checkpoint = checkpoint    # anota los clips abiertos (ver checkpoint.py)
+        self.video_dir = video_dir
+        self.fps = fps
+        self.size = size
+        self.gate = gate  # recibe el estado 'severe' de cada frame (ver make_gate)
+        self.threshold = detector.threshold_frames(fps)
+        self.clip_ext = clip_extension(detector.clip_format)
+
+        # segundos previos al accidente, comprimidos y con memoria acotada
+        self.pre_roll = PreRollBuffer(detector.pre_roll_seconds, fps,
+                                      detector.pre_roll_quality,
+                                      int(detector.pre_roll_max_mb * 1024 * 1024))
+
+        self.recorder = None   # clip en curso (ClipRecorder)
+        self.clips = []        # Futures con los archivos de cada clip
+        self.recording = False
+        self.event = None      # datos del evento del clip en curso
+        self.count_severe = 0
+        self.cooldown_frames = 0
+        self.title_on = False
+        self.frame_index = -1     # último frame procesado
+        self.last_severe = False
+        self.clip_path = None
+        self.clip_start = None    # frame en que se abrió el clip en curso
+        self.peak_confidence = 0.0
+        self.incidents = []       # incidentes terminados (ver checkpoint)
+
+    def process(self, frame, boxes, confs, cls_idxs) -> bool:
+        """
+        Anota el frame, actualiza el conteo 'severe' y escribe el clip.
+        Retorna False si el usuario pidió detener el procesamiento.
+        """
+        detector = self.detector
+        metrics = detector.metrics
+        t0 = time.perf_counter() if metrics is not None else 0.0
+
+        self.frame_index += 1
+
+        # solo "severe" cuenta para el clip
+        severe_boxes, severe_confs, _ = detector.postprocess.severe_boxes(
+            boxes, confs, cls_idxs, detector.confidence_threshold)
+        is_severe = len(severe_confs) > 0  # Marcar que es un accidente severo
+        self.last_severe = is_severe
+
+        # snapshot para reentrenar si hay alguna clase de target_labels (y dónde guardarlo)
+        has_target = False
+        if detector.retrain_dir:
+            _, target_confs, _ = detector.postprocess.target_boxes(
+                boxes, confs, cls_idxs, detector.confidence_threshold)
+            has_target = len(target_confs) > 0
+        if has_target:
+            snapshot = detector.save_snapshot(frame, boxes, confs, cls_idxs)
+            if snapshot and self.event is not None:
+                self.event['snapshot_paths'].append(snapshot)
+
+        # lógica de vídeo para severe
+        if is_severe:
+            self.count_severe += 1
+        else:
+            self.count_severe = max(0, self.count_severe - 1)
+
+        if self.gate is not None:
+            self.gate.update(is_severe, self.count_severe)
+
+        if metrics is not None:
+            t1 = time.perf_counter()
+            metrics.observe('postprocess', t1 - t0)
+            metrics.inc('frames')
+            metrics.inc('detections', len(severe_confs))
+
+        if self.count_severe >= self.threshold and not self.recording:
+            self.recording = True
+            self.title_on = False
+            ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+            # varios clips en el mismo segundo reciben un sufijo
+            vid_path = reserve_path(self.video_dir, f"accidente_severe_{ts}", self.clip_ext)
+            self.recorder = ClipRecorder(vid_path, self.fps, self.size, detector.clip_format,
+                                         detector.clip_max_seconds, detector.encoder_queue, metrics,
+                                         detector.clip_index)
+            self.clips.append(self.recorder.future)
+            self.clip_path = vid_path
+            if self.checkpoint is not None:
+                self.checkpoint.clip_opened(vid_path)
+            self.clip_start = self.frame_index
+            self.peak_confidence = 0.0
+            self._incident('incident_start')
+            if detector.event_store is not None:
+                self.event = {'started_at': time.time(), 'peak_confidence': 0.0,
+                              'clip_path': vid_path, 'snapshot_paths': []}
+            print("Grabando video (severe) en:", vid_path)
+            if self.pre_roll.enabled:
+                kb = self.pre_roll.nbytes / 1024
+                frames = self.pre_roll.drain()
+                self.recorder.write_jpegs(frames)  # se decodifican en el hilo codificador
+                print(f"Buffer previo: {len(frames)} frames ({kb:.0f} KB) agregados al clip")
+            if self.callback:
+                self.callback(vid_path)
+            if metrics is not None:
+                metrics.inc('recordings')
+                now = time.perf_counter()
+                metrics.observe('clip_open', now - t1)  # apertura + buffer previo
+                t1 = now
+
+        # sinks que reciben este frame (una vista previa limitada omite algunos)
+        active = [sink for sink in self.sinks if sink.wants_frame()]
+
+        # copiar y anotar solo si alguien va a usar el frame anotado
+        ann = frame
+        if self.recording or self.pre_roll.enabled or any(sink.needs_annotated for sink in active):
+            ann = frame.copy()
+            for (x1, y1, x2, y2), conf in zip(severe_boxes.astype(int).tolist(), severe_confs):
+                cv2.rectangle(ann, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                cv2.putText(ann, f"severe {conf:.2f}", (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if self.recording and not self.title_on:
+            cv2.putText(ann, "ACCIDENTE SEVERE", (50,50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2, (0,0,255), 5, cv2.LINE_AA)
+            self.title_on = True
+
+        if metrics is not None:
+            t2 = time.perf_counter()
+            metrics.observe('annotate', t2 - t1)
+
+        peak = float(severe_confs.max()) if len(severe_confs) else None
+        if self.recording and peak is not None:
+            self.peak_confidence = max(self.peak_confidence, peak)
+        if self.event is not None and peak is not None:
+            self.event['peak_confidence'] = max(self.event['peak_confidence'], peak)
+
+        if self.recording:
+            self.recorder.write(ann, peak)
+            self.cooldown_frames += 1
+            if self.count_severe == 0 and self.cooldown_frames > self.fps * 2:
+                self.recording = False
+                self.cooldown_frames = 0
+                self.recorder.close()  # el codificador termina el archivo en segundo plano
+                self.recorder = None
+                self._save_event()
+                self._end_incident()
+                print("Finalizada grabación severe.")
+        else:
+            self.pre_roll.push(ann)
+
+        if metrics is not None:
+            t3 = time.perf_counter()
+            metrics.observe('write', t3 - t2)
+
+        keep_going = True
+        for sink in self.sinks:
+            sink.detection(is_severe)
+        for sink in active:
+            if sink.write(ann if sink.needs_annotated else frame) is False:
+                keep_going = False
+
+        if metrics is not None:
+            metrics.observe('display', time.perf_counter() - t3)
+            metrics.frame_out()
+        return keep_going
+
+    def _incident(self, kind: str):
+        if self.on_incident is None:
+            return
+        info = {'type': kind, 'frame': self.frame_index,
+                'pos': self.frame_index / float(self.fps or 1), 'time': time.time(),
+                'clip_path': self.clip_path}
+        if kind == 'incident_end':
+            info['peak_confidence'] = self.peak_confidence
+        self.on_incident(info)
+
+    def _end_incident(self):
+        self.incidents.append({'start_frame': self.clip_start, 'end_frame': self.frame_index,
+                               'clip_path': self.clip_path,
+                               'peak_confidence': self.peak_confidence})
+        self._incident('incident_end')
+        saved = self.detector.clip_saved_callback
+        if saved is not None and self.clips:
+            # el codificador termina el archivo (y sus miniaturas) en segundo plano
+            path = self.clip_path
+            self.clips[-1].add_done_callback(
+                lambda future: future.exception() is None and saved(path))
+
+    def save_checkpoint(self, suspend: bool = False):
+        """
+        Pide guardar el estado en el checkpoint de la sesión (ver checkpoint.py).
+        Se escribe recién cuando los clips ya cerrados terminaron en disco. Con
+        un clip abierto no se guarda: con `suspend` (se detiene a mitad del
+        video) el clip se cierra sin terminar el incidente y queda el checkpoint
+        anterior, así al reanudar el clip se descarta y se graba de nuevo entero.
+        """
+        if self.recording:
+            if suspend and self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None  # close() no debe terminar el incidente
+                self.event = None
+            return
+        checkpoint = self.checkpoint
+        seq = checkpoint.request()
+        state = {
+            'frame': self.frame_index + 1,
+            'count_severe': self.count_severe,
+            'cooldown_frames': self.cooldown_frames,
+            'title_on': self.title_on,
+            'incidents': list(self.incidents),
+        }
+        pending = [f for f in self.clips if not f.done()]
+
+        def save():
+            try:
+                for future in pending:
+                    future.result()
+            except Exception:
+                checkpoint.save(seq, None)  # el codificador falló: queda el checkpoint anterior
+                return
+            checkpoint.save(seq, state)
+
+        when_done(pending, save)
+
+    def restore(self, state: dict):
+        """Retoma el estado de un checkpoint, antes de procesar el primer frame."""
+        self.frame_index = state['frame'] - 1
+        self.count_severe = state['count_severe']
+        self.cooldown_frames = state['cooldown_frames']
+        self.title_on = state['title_on']
+        self.incidents = list(state['incidents'])
+
+    def _save_event(self):
+        """Registra el clip terminado en el repositorio de eventos (sin esperar a la base)."""
+        if self.event is None:
+            return
+        self.detector.event_store.add(self.camera, self.event['started_at'], 'severe',
+                                      self.event['peak_confidence'], self.event['clip_path'],
+                                      self.event['snapshot_paths'], ended_at=time.time())
+        self.event = None
+
+    def close(self, wait: bool = True):
+        """
+        Cierra el clip en curso, si lo hay. Con `wait` espera a que el
+        codificador termine todos los clips y retorna sus archivos.
+        """
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+            self.recording = False
+            self._save_event()
+            self._end_incident()
+        if not wait:
+            return []
+        paths = []
+        for future in self.clips:
+            try:
+                paths.extend(future.result())
+            except Exception:
+                pass  # el codificador ya informó el error
+        return paths
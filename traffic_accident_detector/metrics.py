@@ -0,0 +1,329 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# límites (segundos) de los buckets de los histogramas por etapa
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Metrics:
+    """
+    Interfaz de instrumentación que usa el detector.
+
+    - observe(etapa, segundos, frames): duración de una etapa (decode, inference,
+      postprocess, annotate, write, display, snapshot, pixmap).
+    - inc(contador, n): contadores (frames, detections, recordings, dropped_frames...).
+    - frame_in() / frame_out(): latencia de punta a punta de cada frame.
+
+    El detector solo llama a estos métodos si se le pasó un objeto de métricas;
+    con `metrics=None` no se toma ni un timestamp.
+    """
+
+    def observe(self, stage: str, seconds: float, frames: int = 1):
+        pass
+
+    def inc(self, counter: str, n: int = 1):
+        pass
+
+    def frame_in(self):
+        pass
+
+    def frame_out(self):
+        pass
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+class StageTimer(Metrics):
+    """
+    Guarda cada duración medida por etapa (decode, inference, annotate, write,
+    display) y la latencia de cada frame, desde que se decodifica hasta que se
+    termina de procesar. Pensado para benchmarks: conserva todas las muestras.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)   # etapa -> [segundos]
+        self.frames = defaultdict(int)       # etapa -> frames cubiertos
+        self.counters = defaultdict(int)
+        self.latencies = []
+        self._inflight = deque()
+
+    def observe(self, stage: str, seconds: float, frames: int = 1):
+        self.durations[stage].append(seconds)
+        self.frames[stage] += frames
+
+    def inc(self, counter: str, n: int = 1):
+        self.counters[counter] += n
+
+    def frame_in(self):
+        """Marca un frame recién decodificado (los frames salen en el mismo orden)."""
+        self._inflight.append(time.perf_counter())
+
+    def frame_out(self):
+        """Marca el fin del procesamiento del frame más viejo en curso."""
+        if self._inflight:
+            self.latencies.append(time.perf_counter() - self._inflight.popleft())
+
+    def summary(self) -> dict:
+        """FPS por etapa (frames / tiempo total de la etapa) y percentiles de latencia."""
+        stages = {}
+        for stage, values in self.durations.items():
+            total = sum(values)
+            stages[stage] = {
+                'seconds': total,
+                'frames': self.frames[stage],
+                'fps': self.frames[stage] / total if total > 0 else None,
+            }
+        return {'stages': stages, 'counters': dict(self.counters),
+                'latency_ms': percentiles(self.latencies, scale=1000.0)}
+
+    snapshot = summary
+
+
+def percentiles(values, points=(50, 95, 99), scale: float = 1.0) -> dict:
+    """Percentiles por el método del rango más cercano; vacío si no hay muestras."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        result[f'p{p}'] = ordered[idx] * scale
+    return result
+
+
+class RollingHistogram:
+    """
+    Histograma por buckets acumulados (para Prometheus) más una ventana de las
+    últimas `window` muestras para percentiles recientes.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # el último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            yield bound, total
+
+
+class MetricsRegistry(Metrics):
+    """
+    Métricas en memoria, seguras entre hilos: un histograma por etapa, la
+    latencia por frame y contadores. Se leen con `snapshot()` o en formato de
+    texto de Prometheus con `prometheus_text()`; ver también los exportadores
+    PrometheusFileExporter, MetricsHTTPServer y LogReporter.
+    """
+
+    def __init__(self, labels: dict = None, buckets=DEFAULT_BUCKETS, window: int = 1024):
+        self.labels = dict(labels or {})
+        self.buckets = buckets
+        self.window = window
+        self.stages = {}
+        self.latency = RollingHistogram(buckets, window)
+        self.counters = defaultdict(int)
+        self.stage_frames = defaultdict(int)
+        self.started = time.monotonic()
+        self._inflight = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, frames: int = 1):
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = RollingHistogram(self.buckets, self.window)
+            hist.observe(seconds)
+            self.stage_frames[stage] += frames
+
+    def inc(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def frame_in(self):
+        self._inflight.append(time.perf_counter())
+
+    def frame_out(self):
+        if self._inflight:
+            value = time.perf_counter() - self._inflight.popleft()
+            with self._lock:
+                self.latency.observe(value)
+
+    def snapshot(self) -> dict:
+        """Estado actual: por etapa conteo, total, FPS y percentiles recientes (ms)."""
+        with self._lock:
+            stages = {}
+            for stage, hist in self.stages.items():
+                frames = self.stage_frames[stage]
+                stages[stage] = {
+                    'count': hist.count,
+                    'frames': frames,
+                    'seconds': hist.sum,
+                    'fps': frames / hist.sum if hist.sum > 0 else None,
+                    'recent_ms': percentiles(list(hist.recent), scale=1000.0),
+                }
+            return {
+                'labels': dict(self.labels),
+                'uptime_s': time.monotonic() - self.started,
+                'stages': stages,
+                'latency_ms': percentiles(list(self.latency.recent), scale=1000.0),
+                'counters': dict(self.counters),
+            }
+
+    def prometheus_text(self, prefix: str = 'accident_detector') -> str:
+        """Exposición en formato de texto de Prometheus."""
+        base = ','.join(f'{k}="{v}"' for k, v in sorted(self.labels.items()))
+
+        def labels(extra: str = '') -> str:
+            inner = ','.join(x for x in (base, extra) if x)
+            return '{' + inner + '}' if inner else ''
+
+        lines = []
+        with self._lock:
+            name = f'{prefix}_stage_seconds'
+            lines.append(f'# HELP {name} Duración de cada etapa del pipeline.')
+            lines.append(f'# TYPE {name} histogram')
+            for stage, hist in sorted(self.stages.items()):
+                self._histogram_lines(lines, name, hist, labels, f'stage="{stage}"')
+
+            name = f'{prefix}_frame_latency_seconds'
+            lines.append(f'# HELP {name} Latencia desde la decodificación hasta el fin del procesamiento.')
+            lines.append(f'# TYPE {name} histogram')
+            self._histogram_lines(lines, name, self.latency, labels, '')
+
+            name = f'{prefix}_stage_frames_total'
+            lines.append(f'# TYPE {name} counter')
+            for stage, value in sorted(self.stage_frames.items()):
+                stage_label = f'stage="{stage}"'
+                lines.append(f'{name}{labels(stage_label)} {value}')
+
+            for counter, value in sorted(self.counters.items()):
+                name = f'{prefix}_{counter}_total'
+                lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name}{labels()} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(lines, name, hist, labels, extra):
+        for bound, total in hist.cumulative():
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+            bucket = ','.join(x for x in (extra, le) if x)
+            lines.append(f'{name}_bucket{labels(bucket)} {total}')
+        lines.append(f'{name}_sum{labels(extra)} {hist.sum}')
+        lines.append(f'{name}_count{labels(extra)} {hist.count}')
+
+
+class _PeriodicThread:
+    """Hilo que ejecuta `tick()` cada `interval` segundos hasta `stop()`."""
+
+    def __init__(self, interval: float, name: str):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.tick()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.tick()
+
+    def tick(self):
+        pass
+
+
+class PrometheusFileExporter(_PeriodicThread):
+    """Escribe la exposición de Prometheus a un archivo (p. ej. para node_exporter textfile)."""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 15.0):
+        super().__init__(interval, "metrics-file")
+        self.registry = registry
+        self.path = path
+
+    def tick(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.registry.prometheus_text())
+        os.replace(tmp, self.path)  # el lector nunca ve un archivo a medio escribir
+
+
+class LogReporter(_PeriodicThread):
+    """Imprime periódicamente una línea con FPS por etapa, latencia y contadores."""
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 30.0, log=print):
+        super().__init__(interval, "metrics-log")
+        self.registry = registry
+        self.log = log
+
+    def tick(self):
+        snap = self.registry.snapshot()
+        stages = ' '.join(f"{stage}={v['fps']:.1f}fps" for stage, v in snap['stages'].items()
+                          if v['fps'] is not None)
+        lat = snap['latency_ms']
+        counters = ' '.join(f"{k}={v}" for k, v in snap['counters'].items())
+        prefix = ' '.join(f"{k}={v}" for k, v in snap['labels'].items())
+        self.log(f"[métricas] {prefix} {stages} latencia p50={lat.get('p50', 0):.1f}ms "
+                 f"p99={lat.get('p99', 0):.1f}ms {counters}".strip())
+
+
+class MetricsHTTPServer:
+    """Endpoint HTTP local: /metrics (texto Prometheus) y /snapshot (JSON)."""
+
+    def __init__(self, registry: MetricsRegistry, port: int = 9108, host: str = '127.0.0.1'):
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                import json
+                if self.path.startswith('/metrics'):
+                    body = registry_ref.prometheus_text().encode('utf-8')
+                    ctype = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.startswith('/snapshot'):
+                    body = json.dumps(registry_ref.snapshot()).encode('utf-8')
+                    ctype = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
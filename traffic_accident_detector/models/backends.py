@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Any
+
+from ultralytics import YOLO
+
+# backends de inferencia soportados por load_model
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+# dataset del proyecto: calibración INT8 y comparación de precisión
+DATA_YAML = os.path.join(os.path.dirname(__file__), '..', '..', 'yolov8', 'data.yaml')
+
+
+def exported_path(model_path: str, backend: str, int8: bool = False) -> str:
+    """Ruta del artefacto exportado, junto a los pesos (p. ej. best.onnx, best_openvino_model/)."""
+    base, _ = os.path.splitext(model_path)
+    if backend == 'onnx':
+        return f"{base}.int8.onnx" if int8 else f"{base}.onnx"
+    if backend == 'openvino':
+        return f"{base}_int8_openvino_model" if int8 else f"{base}_openvino_model"
+    return model_path
+
+
+def _is_fresh(artifact: str, model_path: str) -> bool:
+    """El artefacto existe y es más nuevo que los pesos de los que salió."""
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(model_path)
+
+
+def export_model(model_path: str, backend: str, int8: bool = False, imgsz: int = 640,
+                 data: str = None) -> str:
+    """
+    Exporta `best.pt` al backend pedido una sola vez y reutiliza el artefacto en
+    las siguientes cargas. Con `int8` se aplica cuantización dinámica (ONNX) o la
+    cuantización de OpenVINO, calibrada con las imágenes de `data` (por defecto
+    el dataset `yolov8` del proyecto, no el dataset genérico de ultralytics).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend}. Opciones: {', '.join(BACKENDS)}")
+    if backend == 'torch':
+        return model_path
+
+    artifact = exported_path(model_path, backend, int8)
+    if _is_fresh(artifact, model_path):
+        return artifact
+
+    if backend == 'onnx':
+        onnx_path = exported_path(model_path, 'onnx')
+        if not _is_fresh(onnx_path, model_path):
+            # dynamic=True para aceptar lotes de tamaño variable
+            onnx_path = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True)
+        if int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(onnx_path, artifact, weight_type=QuantType.QUInt8)
+            return artifact
+        return onnx_path
+
+    # openvino: ultralytics escribe la carpeta <nombre>[_int8]_openvino_model junto a los pesos
+    if not int8:
+        return YOLO(model_path).export(format='openvino', imgsz=imgsz, dynamic=True)
+    data = data or DATA_YAML
+    if not os.path.exists(data):
+        raise FileNotFoundError(f"No se encontró el dataset de calibración INT8: {data}")
+    return YOLO(model_path).export(format='openvino', imgsz=imgsz, dynamic=True, int8=True,
+                                   data=data)
+
+
+def compare_backends(model_path: str, backend: str, int8: bool = False,
+                     data: str = None, split: str = 'test', imgsz: int = 640) -> Dict[str, Any]:
+    """
+    Compara la precisión de un backend exportado contra PyTorch sobre el split
+    de prueba del dataset `yolov8` y retorna las métricas y su diferencia.
+    """
+    data = data or DATA_YAML
+
+    def evaluate(path):
+        metrics = YOLO(path, task='detect').val(data=data, split=split, imgsz=imgsz,
+                                               batch=1, verbose=False, plots=False)
+        return {'map50': float(metrics.box.map50), 'map50_95': float(metrics.box.map)}
+
+    baseline = evaluate(model_path)
+    candidate = evaluate(export_model(model_path, backend, int8, imgsz, data))
+    report = {
+        'backend': backend,
+        'int8': int8,
+        'torch': baseline,
+        backend: candidate,
+        'delta': {k: candidate[k] - baseline[k] for k in baseline},
+    }
+    print(f"{backend}{' int8' if int8 else ''}: mAP50 {candidate['map50']:.4f} "
+          f"({report['delta']['map50']:+.4f}), mAP50-95 {candidate['map50_95']:.4f} "
+          f"({report['delta']['map50_95']:+.4f}) vs PyTorch")
+    return report
@@ -1,19 +1,177 @@
 import os
+import threading
+import time
+from collections import OrderedDict
 from ultralytics import YOLO
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+from traffic_accident_detector.models.backends import export_model
 
-def load_model(model_path: str, device: str = "auto") -> YOLO:
+def load_model(model_path: str, device: str = "auto", backend: str = "torch",
+               int8: bool = False) -> YOLO:
     """
-    Carga un modelo YOLO desde una ruta
+    Carga un modelo YOLO desde una ruta. Con backend 'onnx' u 'openvino' exporta
+    los pesos una vez (ver models.backends) y carga el artefacto, que responde con
+    la misma interfaz `model(frame)` / `model.names`.
     """
     try:
-        model = YOLO(model_path)
-        if device != "auto":
-            model.to(device)
-        return model
+        if backend == "torch":
+            model = YOLO(model_path)
+            if device != "auto":
+                model.to(device)
+            return model
+        return YOLO(export_model(model_path, backend, int8), task="detect")
     except Exception as e:
         raise RuntimeError(f"Error al cargar el modelo desde {model_path}: {e}")
 
+class _RegistryEntry:
+    def __init__(self):
+        self.model = None
+        self.error = None
+        self.loaded = threading.Event()
+        self.lock = threading.Lock()   # serializa inferencias sobre el modelo compartido
+        self.last_used = time.monotonic()
+        self.users = 0                 # detectores que lo usan (ver acquire)
+
+
+class ModelRegistry:
+    """
+    Caché de modelos YOLO compartidos por todo el proceso.
+
+    La clave es (ruta real, mtime, tamaño, dispositivo, backend): si el archivo de pesos
+    cambia en disco se carga de nuevo. Si varios hilos piden el mismo modelo a la
+    vez, solo el primero lo carga y los demás esperan ese mismo objeto. Los modelos
+    se liberan por LRU (`max_models`) o tras `idle_timeout` segundos sin uso;
+    los que tienen usuarios (`acquire` sin `release_user`) no se liberan.
+    """
+
+    def __init__(self, max_models: int = 4, idle_timeout: float = 600.0, warmup: bool = True):
+        self.max_models = max_models
+        self.idle_timeout = idle_timeout
+        self.warmup = warmup
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_path: str, device: str = "auto", backend: str = "torch",
+                 int8: bool = False) -> Tuple:
+        path = os.path.realpath(model_path)
+        try:
+            st = os.stat(path)
+            return (path, st.st_mtime_ns, st.st_size, device, backend, int8)
+        except OSError:
+            return (path, None, None, device, backend, int8)
+
+    def get(self, model_path: str, device: str = "auto", backend: str = "torch",
+            int8: bool = False) -> YOLO:
+        """Retorna el modelo compartido, cargándolo (y calentándolo) si hace falta."""
+        return self._get_entry(model_path, device, backend, int8, False).model
+
+    def acquire(self, model_path: str, device: str = "auto", backend: str = "torch",
+                int8: bool = False) -> Tuple[YOLO, threading.Lock]:
+        """
+        Modelo compartido y su lock de inferencia, tomados juntos. Cuenta al
+        llamador como usuario: el modelo no se libera hasta `release_user`.
+        """
+        entry = self._get_entry(model_path, device, backend, int8, True)
+        return entry.model, entry.lock
+
+    def release_user(self, model):
+        """El llamador de `acquire` ya no usa el modelo."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.model is model and entry.users > 0:
+                    entry.users -= 1
+                    entry.last_used = time.monotonic()
+                    return
+
+    def _get_entry(self, model_path, device, backend, int8, use: bool) -> _RegistryEntry:
+        key = self.make_key(model_path, device, backend, int8)
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = _RegistryEntry()
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            entry.last_used = time.monotonic()
+            if use:
+                entry.users += 1
+
+        if owner:
+            try:
+                entry.model = load_model(model_path, device, backend, int8)
+                if self.warmup:
+                    warmup_model(entry.model)
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    self._entries.pop(key, None)
+            finally:
+                entry.loaded.set()
+            with self._lock:
+                self._evict_lru_locked()
+        else:
+            entry.loaded.wait()
+
+        if entry.error is not None:
+            raise entry.error
+        return entry
+
+    def release(self, model_path: str, device: str = "auto", backend: str = "torch",
+                int8: bool = False):
+        with self._lock:
+            self._entries.pop(self.make_key(model_path, device, backend, int8), None)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items()
+                    if e.loaded.is_set() and not e.users
+                    and now - e.last_used > self.idle_timeout]:
+            del self._entries[key]
+
+    def _evict_lru_locked(self):
+        while len(self._entries) > self.max_models:
+            key = next((k for k, e in self._entries.items()
+                        if e.loaded.is_set() and not e.users), None)
+            if key is None:
+                break
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def warmup_model(model: YOLO, imgsz: int = 640):
+    """Una inferencia en vacío para que la primera detección real no pague la inicialización."""
+    import numpy as np
+
+    model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+
+
+_registry = ModelRegistry()
+
+
+def get_model(model_path: str, device: str = "auto", backend: str = "torch",
+              int8: bool = False) -> YOLO:
+    """
+    Retorna un modelo YOLO compartido desde el registro del proceso
+    """
+    return _registry.get(model_path, device, backend, int8)
+
+
+def get_registry() -> ModelRegistry:
+    return _registry
+
+
 def get_model_info(model: YOLO) -> Dict[str, Any]:
     """
     Obtiene información sobre un modelo YOLO
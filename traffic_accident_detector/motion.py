@@ -0,0 +1,96 @@
+import cv2
+
+
+class MotionGate:
+    """
+    Filtro barato antes del modelo: omite la inferencia cuando la escena no cambia.
+
+    Cada frame se reduce a `scale_width` px de ancho en escala de grises (solo la
+    ROI, si se indicó) y se compara contra el último frame inferido ('diff') o se
+    pasa por un sustractor de fondo MOG2 ('mog2'). Si la fracción de píxeles que
+    cambiaron no llega a `threshold` el frame se omite y hereda las últimas cajas.
+
+    Cada `keyframe_interval` frames se infiere igual, aunque no haya movimiento.
+    Mientras el conteo 'severe' sea mayor que cero se infieren todos los frames,
+    así el decaimiento del conteo no depende de frames heredados.
+    Se puede encadenar con otra compuerta (`inner`, p. ej. AdaptiveStride).
+    """
+
+    METHODS = ('diff', 'mog2')
+
+    def __init__(self, threshold: float = 0.005, pixel_delta: int = 25, roi=None,
+                 scale_width: int = 160, keyframe_interval: int = 50,
+                 method: str = 'diff', inner=None):
+        if method not in self.METHODS:
+            raise ValueError(f"Método desconocido: {method}. Opciones: {', '.join(self.METHODS)}")
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.roi = roi                    # (x, y, w, h) en píxeles del frame original
+        self.scale_width = scale_width
+        self.keyframe_interval = keyframe_interval
+        self.method = method
+        self.inner = inner
+
+        self.reference = None             # último frame inferido, reducido
+        self.subtractor = None
+        self.forced = False               # hay un incidente en curso
+        self.since_inference = 0
+
+        self.frames = 0
+        self.skipped = 0
+        self.keyframes = 0
+
+    def _small(self, frame):
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            frame = frame[y:y + h, x:x + w]
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.scale_width / float(w))
+        small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_fraction(self, small) -> float:
+        """Fracción de píxeles que cambiaron respecto a la referencia."""
+        if self.method == 'mog2':
+            if self.subtractor is None:
+                self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            mask = self.subtractor.apply(small)
+            return cv2.countNonZero(mask) / float(mask.size)
+        if self.reference is None:
+            return 1.0
+        diff = cv2.absdiff(small, self.reference)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)[1]) \
+            / float(diff.size)
+
+    def should_infer(self, frame) -> bool:
+        self.frames += 1
+        self.since_inference += 1
+        small = self._small(frame)
+        moving = self.motion_fraction(small) >= self.threshold
+        inner_ok = self.inner is None or self.inner.should_infer(frame)
+
+        keyframe = self.reference is None or self.since_inference >= self.keyframe_interval
+        infer = self.forced or keyframe or (moving and inner_ok)
+        if infer:
+            if keyframe and not (self.forced or (moving and inner_ok)):
+                self.keyframes += 1
+            self.reference = small
+            self.since_inference = 0
+        else:
+            self.skipped += 1
+        return infer
+
+    def update(self, is_severe: bool, count_severe: int):
+        self.forced = count_severe > 0
+        if self.inner is not None:
+            self.inner.update(is_severe, count_severe)
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'skipped_fraction': self.skipped / self.frames if self.frames else 0.0,
+            'keyframes': self.keyframes,
+        }
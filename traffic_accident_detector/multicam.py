@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from traffic_accident_detector.detector import AccidentDetector, DetectionSession
+from traffic_accident_detector.motion import MotionGate
+from traffic_accident_detector.sinks import QtPreviewSink
+from traffic_accident_detector.stream import LatestFrameGrabber, open_source
+
+
+class CameraStream:
+    """Fuente de video de una cámara: lector en su propio hilo más su estado 'severe'."""
+
+    def __init__(self, name: str, source, queue_size: int = 8, drop_old: bool = False,
+                 metrics=None):
+        self.name = name
+        self.source = source
+        self.drop_old = drop_old
+        self.metrics = metrics
+
+        # en vivo: lector con el último frame y reconexión (ver stream.py)
+        self.cap = open_source(source, metrics=metrics)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir la cámara '{name}': {source}")
+        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 25
+        self.size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                     int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self.frames = deque()
+        self.queue_size = queue_size
+        self.cond = threading.Condition()
+        self.finished = False
+        self.stopped = False
+
+        self.session = None
+        self.gate = None
+        self.last_result = None
+
+        self.decoded = 0
+        self.processed = 0
+        self.inferences = 0
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._read_loop, name=f"camara-{name}", daemon=True)
+
+    def _read_loop(self):
+        while not self.stopped:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            with self.cond:
+                # archivos: esperar espacio (backpressure); en vivo: descartar el más viejo
+                while len(self.frames) >= self.queue_size and not self.drop_old and not self.stopped:
+                    self.cond.wait(timeout=0.1)
+                if len(self.frames) >= self.queue_size:
+                    self.frames.popleft()
+                    self.dropped += 1
+                    if self.metrics is not None:
+                        self.metrics.inc('dropped_frames')
+                self.frames.append(frame)
+                self.decoded += 1
+                self.cond.notify_all()
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def take(self, latest: bool = False):
+        """Saca el siguiente frame (o el más nuevo, descartando el resto); None si no hay."""
+        with self.cond:
+            if not self.frames:
+                return None
+            if latest:
+                self.dropped += len(self.frames) - 1
+                if self.metrics is not None and len(self.frames) > 1:
+                    self.metrics.inc('dropped_frames', len(self.frames) - 1)
+                frame = self.frames.pop()
+                self.frames.clear()
+            else:
+                frame = self.frames.popleft()
+            self.cond.notify_all()
+            return frame
+
+    @property
+    def done(self) -> bool:
+        return self.stopped or (self.finished and not self.frames)
+
+    def stats(self) -> dict:
+        stats = {
+            'decoded': self.decoded,
+            'processed': self.processed,
+            'inferences': self.inferences,
+            'dropped': self.dropped,
+            'queued': len(self.frames),
+        }
+        if isinstance(self.gate, MotionGate):
+            stats['motion'] = self.gate.stats()
+        return stats
+
+
+class MultiCameraEngine:
+    """
+    Procesa varias cámaras con un solo modelo cargado en memoria.
+
+    En cada ronda toma frames de las cámaras en orden rotativo y los infiere en
+    una sola pasada; cada cámara conserva su propio conteo 'severe', sus clips
+    (en una subcarpeta con su nombre) y sus sinks. `previews` agrega una vista
+    previa Qt por cámara, todas con el mismo límite de FPS y tamaño.
+
+    Políticas de equidad:
+      - 'round_robin': como máximo un frame por cámara en cada lote, así una
+        cámara con más FPS no acapara el modelo; no se descartan frames.
+      - 'latest': igual, pero se usa el frame más nuevo de cada cámara y se
+        descartan los atrasados (latencia acotada para cámaras en vivo).
+    """
+
+    POLICIES = ('round_robin', 'latest')
+
+    def __init__(self, detector: AccidentDetector, sources: dict, policy: str = 'round_robin',
+                 max_batch: int = None, queue_size: int = 8, camera_sinks: dict = None,
+                 callback=None, user_output_dir: str = None, previews: dict = None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Opciones: {', '.join(self.POLICIES)}")
+        self.detector = detector
+        self.policy = policy
+        self.max_batch = max_batch or len(sources)
+        self.callback = callback  # callback(nombre_camara, ruta_clip)
+        self._stop = threading.Event()
+        self._next = 0  # cámara con la que empieza la próxima ronda
+
+        camera_sinks = camera_sinks or {}
+        previews = previews or {}  # nombre -> callback(QPixmap) de su recuadro en la interfaz
+        output_dir = user_output_dir or detector.output_dir
+        self.cameras = []
+        for name, source in sources.items():
+            cam = CameraStream(name, source, queue_size, drop_old=(policy == 'latest'),
+                               metrics=detector.metrics)
+            video_dir = os.path.join(output_dir, str(name))
+            os.makedirs(video_dir, exist_ok=True)
+            if detector.frame_stride > 1 or detector.motion_gate:
+                cam.gate = detector.make_gate()
+            sinks = list(camera_sinks.get(name, []))
+            if name in previews:
+                # un solo limitador (detector.preview) para todos los recuadros
+                sinks.append(QtPreviewSink(previews[name], detector.convert_frame_to_pixmap,
+                                           detector.preview, name))
+            cam.session = DetectionSession(detector, video_dir, cam.fps, cam.size, cam.gate,
+                                           sinks=sinks,
+                                           callback=self._clip_callback(name), camera=str(name))
+            self.cameras.append(cam)
+
+    def _clip_callback(self, name):
+        def on_clip(path):
+            if self.callback:
+                self.callback(name, path)
+        return on_clip
+
+    def stop(self):
+        self._stop.set()
+
+    def _collect(self):
+        """Arma un lote justo: una vuelta por las cámaras empezando por la siguiente en turno."""
+        batch = []
+        n = len(self.cameras)
+        for i in range(n):
+            if len(batch) >= self.max_batch:
+                break
+            cam = self.cameras[(self._next + i) % n]
+            if cam.done:
+                continue
+            frame = cam.take(latest=(self.policy == 'latest'))
+            if frame is None:
+                continue
+            if cam.gate is not None and not cam.gate.should_infer(frame) \
+                    and cam.last_result is not None:
+                # frame sin inferencia: se procesa con las últimas cajas de la cámara
+                self._dispatch(cam, frame, cam.last_result)
+                continue
+            batch.append((cam, frame))
+        self._next = (self._next + 1) % n
+        return batch
+
+    def _dispatch(self, cam, frame, res):
+        cam.processed += 1
+        if not cam.session.process(frame, res.boxes.xyxy, res.boxes.conf, res.boxes.cls):
+            cam.stopped = True
+
+    def run(self):
+        """Bloquea hasta que terminen todas las cámaras o se llame a `stop()`."""
+        for cam in self.cameras:
+            cam.thread.start()
+        try:
+            while not self._stop.is_set() and not all(cam.done for cam in self.cameras):
+                batch = self._collect()
+                if not batch:
+                    time.sleep(0.002)
+                    continue
+                results = self.detector._infer([frame for _, frame in batch])
+                for (cam, frame), res in zip(batch, results):
+                    cam.inferences += 1
+                    cam.last_result = res
+                    self._dispatch(cam, frame, res)
+        finally:
+            for cam in self.cameras:
+                cam.stopped = True
+                with cam.cond:
+                    cam.cond.notify_all()
+                if isinstance(cam.cap, LatestFrameGrabber):
+                    cam.cap.stop()  # despierta al lector que espera un frame
+                cam.thread.join(timeout=1.0)
+                cam.cap.release()
+                cam.session.close()
+                for sink in cam.session.sinks:
+                    sink.close()
+            self.detector.flush_snapshots()
+
+    def stats(self) -> dict:
+        """Contadores por cámara (frames decodificados, procesados, inferidos y descartados)."""
+        return {cam.name: cam.stats() for cam in self.cameras}
@@ -0,0 +1,210 @@
+import queue
+import threading
+import time
+
+# marca de fin de stream entre etapas
+_END = object()
+
+# espera máxima (s) de cada intento sobre una cola antes de revisar si hay que detenerse
+_POLL = 0.05
+
+
+class BatchScheduler:
+    """
+    Agrupa frames en lotes para una sola pasada del modelo.
+
+    Los frames que la compuerta (`gate.should_infer`) descarta no van al modelo:
+    reciben el último resultado inferido. Todos los frames salen en su orden
+    original como pares (frame, resultado, inferido).
+    """
+
+    def __init__(self, infer, batch_size: int = 1, batch_timeout: float = 0.1, gate=None):
+        self.infer = infer
+        self.batch_size = max(1, int(batch_size))
+        self.batch_timeout = batch_timeout
+        self.gate = gate
+
+        self.pending = []         # (frame, necesita_inferencia) en orden
+        self.batch_count = 0      # frames pendientes que van al modelo
+        self.batch_start = 0.0
+        self.last_result = None
+
+        self.frames = 0
+        self.inferences = 0
+
+    def push(self, frame):
+        """Agrega un frame; retorna los pares listos (puede ser una lista vacía)."""
+        self.frames += 1
+        needs_infer = self.last_result is None and self.batch_count == 0
+        if not needs_infer:
+            needs_infer = self.gate is None or self.gate.should_infer(frame)
+        elif self.gate is not None:
+            self.gate.should_infer(frame)  # mantiene la cuenta de la compuerta
+        if needs_infer:
+            if self.batch_count == 0:
+                self.batch_start = time.monotonic()
+            self.batch_count += 1
+        self.pending.append((frame, needs_infer))
+
+        if self.batch_count >= self.batch_size:
+            return self.flush()
+        return self.poll()
+
+    def poll(self):
+        """Vacía el lote si venció la espera máxima."""
+        if self.batch_count and time.monotonic() - self.batch_start >= self.batch_timeout:
+            return self.flush()
+        if self.batch_count == 0 and self.pending:
+            return self.flush()
+        return []
+
+    def remaining_wait(self):
+        """Segundos hasta que vence el lote actual (None si no hay lote)."""
+        if not self.batch_count:
+            return None
+        return max(0.0, self.batch_timeout - (time.monotonic() - self.batch_start))
+
+    def flush(self):
+        """Infiere el lote pendiente y retorna todos los pares en orden."""
+        if not self.pending:
+            return []
+        results = iter(())
+        if self.batch_count:
+            batch = [frame for frame, needs_infer in self.pending if needs_infer]
+            results = iter(self.infer(batch))
+            self.inferences += len(batch)
+
+        ready = []
+        for frame, needs_infer in self.pending:
+            if needs_infer:
+                self.last_result = next(results)
+            ready.append((frame, self.last_result, needs_infer))
+        self.pending = []
+        self.batch_count = 0
+        return ready
+
+
+class StagedPipeline:
+    """
+    Pipeline por etapas: decodificación -> inferencia -> anotación/escritura.
+
+    La decodificación y la inferencia corren en hilos propios; la etapa de
+    anotación y escritura la consume quien llama a `results()`, en el orden
+    original de los frames. Las colas son acotadas, así que una etapa lenta
+    frena a las anteriores (backpressure) en lugar de acumular memoria.
+    """
+
+    def __init__(self, cap, scheduler: BatchScheduler, queue_size: int = 8, metrics=None):
+        self.cap = cap
+        self.scheduler = scheduler
+        self.metrics = metrics
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)    # decodificados
+        self.result_queue = queue.Queue(maxsize=queue_size)   # inferidos
+
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name="pipeline-decode", daemon=True),
+            threading.Thread(target=self._infer_loop, name="pipeline-infer", daemon=True),
+        ]
+
+    def queue_depths(self) -> dict:
+        """Profundidad actual de la cola de entrada de cada etapa."""
+        return {
+            'inference': self.frame_queue.qsize(),
+            'annotate': self.result_queue.qsize(),
+        }
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        """Detiene los hilos y vacía las colas para desbloquearlos."""
+        self._stop.set()
+        if hasattr(self.cap, 'stop'):
+            self.cap.stop()  # LatestFrameGrabber: no esperar el próximo frame de la cámara
+        for t in self._threads:
+            while t.is_alive():
+                self._drain(self.frame_queue)
+                self._drain(self.result_queue)
+                try:
+                    self.frame_queue.put_nowait(_END)  # despierta a la inferencia si espera
+                except queue.Full:
+                    pass
+                t.join(timeout=_POLL)
+
+    def results(self):
+        """Genera (frame, resultado, inferido) en orden hasta el fin del video."""
+        while True:
+            item = self.result_queue.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    # -- etapas --------------------------------------------------------------
+
+    def _put(self, q, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode_loop(self):
+        try:
+            metrics = self.metrics
+            while not self._stop.is_set():
+                t0 = time.perf_counter() if metrics is not None else 0.0
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if metrics is not None:
+                    metrics.observe('decode', time.perf_counter() - t0)
+                    metrics.frame_in()
+                if not self._put(self.frame_queue, frame):
+                    return
+        except Exception as e:
+            self._error = e
+        self._put(self.frame_queue, _END)
+
+    def _infer_loop(self):
+        scheduler = self.scheduler
+        try:
+            while not self._stop.is_set():
+                # sin lote pendiente también se espera poco, para ver `_stop` a tiempo
+                wait = scheduler.remaining_wait()
+                try:
+                    frame = self.frame_queue.get(timeout=_POLL if wait is None else min(wait, _POLL))
+                except queue.Empty:
+                    frame = None  # venció la espera máxima del lote (o toca revisar `_stop`)
+
+                if frame is _END:
+                    ready = scheduler.flush()
+                elif frame is not None:
+                    ready = scheduler.push(frame)
+                else:
+                    ready = scheduler.poll()
+
+                for item in ready:
+                    if not self._put(self.result_queue, item):
+                        return
+                if frame is _END:
+                    break
+        except Exception as e:
+            self._error = e
+        self._put(self.result_queue, _END)
+
+    @staticmethod
+    def _drain(q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,84 @@
+import numpy as np
+
+_EMPTY_BOXES = np.zeros((0, 4), np.float32)
+
+
+def to_numpy(values, dtype):
+    """Tensor (CPU o GPU), lista o arreglo -> arreglo de NumPy del tipo indicado."""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=dtype)
+
+
+class ClassSet:
+    """
+    Conjunto de clases precalculado desde `model.names`: una tabla booleana
+    indexada por el id de clase, así el filtrado por nombre es una sola máscara.
+    """
+
+    def __init__(self, names: dict, labels):
+        labels = set(labels)
+        self.ids = np.array(sorted(i for i, name in names.items() if name in labels), dtype=np.int64)
+        self.table = np.zeros(max(names) + 1 if names else 0, dtype=bool)
+        self.table[self.ids] = True
+
+    def mask(self, clss) -> np.ndarray:
+        return self.table[clss]
+
+
+class PostProcessor:
+    """
+    Post-procesamiento de la salida del modelo, compartido por el detector, los
+    snapshots del dataset y la interfaz.
+
+    Convierte cajas, confianzas y clases a arreglos una vez por frame y filtra
+    por confianza y clase con máscaras, sin recorrer las cajas en Python.
+    """
+
+    def __init__(self, names, target_labels, severe_labels=('severe',)):
+        if not isinstance(names, dict):
+            names = dict(enumerate(names))
+        self.names = names
+        self.target = ClassSet(names, target_labels)
+        self.severe = ClassSet(names, severe_labels)
+
+    @staticmethod
+    def arrays(boxes, confs, clss):
+        """(boxes Nx4 float32, confs N float32, clss N int64)."""
+        confs = to_numpy(confs, np.float32).reshape(-1)
+        if not len(confs):
+            return _EMPTY_BOXES, confs, np.zeros(0, np.int64)
+        return (to_numpy(boxes, np.float32).reshape(-1, 4), confs,
+                to_numpy(clss, np.int64).reshape(-1))
+
+    def select(self, classes: ClassSet, boxes, confs, clss, threshold: float):
+        """Solo las cajas de `classes` con confianza >= threshold, como arreglos compactos."""
+        boxes, confs, clss = self.arrays(boxes, confs, clss)
+        keep = (confs >= threshold) & classes.mask(clss)
+        return boxes[keep], confs[keep], clss[keep]
+
+    def severe_boxes(self, boxes, confs, clss, threshold: float):
+        return self.select(self.severe, boxes, confs, clss, threshold)
+
+    def target_boxes(self, boxes, confs, clss, threshold: float):
+        return self.select(self.target, boxes, confs, clss, threshold)
+
+
+def yolo_rows(boxes, clss, width: int, height: int) -> np.ndarray:
+    """
+    Filas YOLO (clase, xc, yc, w, h) normalizadas al tamaño del frame. Las
+    coordenadas se truncan a píxeles enteros antes de normalizar.
+    """
+    px = np.trunc(boxes)
+    rows = np.empty((len(px), 5), dtype=np.float64)
+    rows[:, 0] = clss
+    rows[:, 1] = (px[:, 0] + px[:, 2]) / 2 / width
+    rows[:, 2] = (px[:, 1] + px[:, 3]) / 2 / height
+    rows[:, 3] = (px[:, 2] - px[:, 0]) / width
+    rows[:, 4] = (px[:, 3] - px[:, 1]) / height
+    return rows
+
+
+def yolo_text(rows) -> str:
+    """Contenido del .txt de etiquetas YOLO, una línea por fila."""
+    return ''.join(f"{int(r[0])} {r[1]:.6f} {r[2]:.6f} {r[3]:.6f} {r[4]:.6f}\n" for r in rows)
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import cv2
+
+
+class PreviewThrottle:
+    """
+    Limita la vista previa a `fps` cuadros por segundo y a un tamaño máximo.
+
+    Una sola instancia se comparte entre las vistas (p. ej. las cuatro cámaras):
+    cada vista usa su propia clave, con su propio reloj y, si se indica con
+    `set_size`, su propio tamaño. Los frames que llegan antes de tiempo se
+    descartan sin convertirlos; los que se muestran se reducen una sola vez con
+    INTER_AREA, así la interfaz no le quita tiempo al bucle de detección.
+    """
+
+    def __init__(self, fps: float = 15.0, size=(640, 360), clock=time.monotonic):
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.size = tuple(size) if size else None
+        self.clock = clock
+        self._sizes = {}
+        self._last = {}
+        self._lock = threading.Lock()
+        self.shown = 0
+        self.skipped = 0
+
+    def set_size(self, key, size):
+        """Tamaño máximo (ancho, alto) de una vista; None = el tamaño por defecto."""
+        with self._lock:
+            if size:
+                self._sizes[key] = tuple(size)
+            else:
+                self._sizes.pop(key, None)
+
+    def due(self, key=None) -> bool:
+        """¿Ya toca mostrar un frame en esta vista? No consume el turno."""
+        last = self._last.get(key)
+        return last is None or self.clock() - last >= self.interval
+
+    def take(self, key=None) -> bool:
+        """Como `due`, pero si toca registra el frame como mostrado."""
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self.skipped += 1
+                return False
+            # sin acumular atraso: el siguiente turno cuenta desde ahora
+            self._last[key] = now
+            self.shown += 1
+            return True
+
+    def downscale(self, frame, key=None):
+        """Reduce el frame para que quepa en el tamaño de la vista, sin agrandarlo."""
+        size = self._sizes.get(key, self.size)
+        if size is None:
+            return frame
+        h, w = frame.shape[:2]
+        scale = min(size[0] / float(w), size[1] / float(h))
+        if scale >= 1.0:
+            return frame
+        return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    def prepare(self, frame, key=None):
+        """Frame reducido si toca mostrarlo en esta vista, None si se omite."""
+        if not self.take(key):
+            return None
+        return self.downscale(frame, key)
+
+    def stats(self) -> dict:
+        return {'shown': self.shown, 'skipped': self.skipped}
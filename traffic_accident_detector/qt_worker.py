@@ -0,0 +1,131 @@
+import threading
+
+import cv2
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from traffic_accident_detector.detector import AccidentDetector
+from traffic_accident_detector.sinks import FrameSink
+from traffic_accident_detector.stream import is_live_source
+
+
+class SignalSink(FrameSink):
+    """
+    Sink del detector que pasa los frames al hilo de la interfaz.
+
+    Con `throttle` (PreviewThrottle) solo recibe los frames que tocan según el
+    FPS de la vista previa y los entrega ya reducidos. Guarda una referencia al
+    último frame (sin copiarlo) y emite `frameReady` si la interfaz ya tomó el
+    anterior; si la interfaz va más lenta, los frames intermedios se reemplazan
+    en vez de acumularse en la cola de eventos de Qt.
+    """
+
+    def __init__(self, worker, total_frames: int = 0, throttle=None, key=None):
+        self.worker = worker
+        self.total = total_frames
+        self.throttle = throttle
+        self.key = key
+        self.frames = 0
+        self.is_severe = False
+        self.last_percent = -1
+
+    def detection(self, is_severe: bool):
+        # se llama en todos los frames, también en los que la vista previa omite
+        self.frames += 1
+        percent = self.frames * 100 // self.total if self.total else 0
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.worker.progress.emit(self.frames, self.total)
+        if is_severe != self.is_severe:
+            self.is_severe = is_severe
+            self.worker.detectionChanged.emit(is_severe)
+
+    def wants_frame(self) -> bool:
+        # al cancelar se pide el frame para responder False en write
+        return self.worker.cancelled or self.throttle is None or self.throttle.due(self.key)
+
+    def write(self, frame) -> bool:
+        if self.worker.cancelled:
+            return False
+        if self.throttle is not None:
+            frame = self.throttle.prepare(frame, self.key)
+        if frame is not None:
+            self.worker.offer_frame(frame)
+        return True
+
+
+class DetectionWorker(QObject):
+    """
+    Procesa un video con AccidentDetector fuera del hilo de la interfaz.
+
+    Se mueve a un QThread y se arranca conectando `QThread.started` a `run`.
+    La interfaz recibe los frames con `frameReady` + `take_frame()`, el estado
+    de detección, el avance y los clips por señales; `cancel()` detiene el
+    procesamiento en el siguiente frame.
+    """
+
+    frameReady = pyqtSignal()                # hay un frame nuevo para take_frame()
+    detectionChanged = pyqtSignal(bool)      # cambió la presencia de 'severe' en el frame
+    progress = pyqtSignal(int, int)          # frames procesados, total del video
+    accidentDetected = pyqtSignal(str)       # ruta del clip grabado
+    clipSaved = pyqtSignal(str)              # el clip terminó de escribirse (con miniaturas)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal(bool)              # True si se canceló
+
+    def __init__(self, video_path: str, output_dir: str, preview=None, preview_key=None,
+                 **detector_kwargs):
+        super().__init__()
+        self.video_path = video_path
+        self.output_dir = output_dir
+        self.preview = preview          # PreviewThrottle compartido; None = todos los frames
+        self.preview_key = preview_key
+        self.detector_kwargs = detector_kwargs
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._frame = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Se puede llamar desde cualquier hilo."""
+        self._cancel.set()
+
+    def offer_frame(self, frame):
+        with self._lock:
+            pending = self._frame is not None
+            self._frame = frame
+        if not pending:
+            self.frameReady.emit()
+
+    def take_frame(self):
+        """Último frame anotado (BGR) o None; lo llama la interfaz al recibir frameReady."""
+        with self._lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    @pyqtSlot()
+    def run(self):
+        detector = None
+        try:
+            total = 0  # en vivo no hay largo conocido
+            if not is_live_source(self.video_path):
+                cap = cv2.VideoCapture(self.video_path)
+                total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+                cap.release()
+
+            sink = SignalSink(self, total, self.preview, self.preview_key)
+            detector = AccidentDetector(output_dir=self.output_dir,
+                                        callback=self.accidentDetected.emit,
+                                        clip_saved_callback=self.clipSaved.emit,
+                                        sinks=[sink], **self.detector_kwargs)
+            if not self.cancelled:
+                # iter_detections propaga los errores (detect_from_video solo los imprime)
+                for _ in detector.iter_detections(self.video_path):
+                    pass
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            if detector is not None:
+                detector.close()
+            self.finished.emit(self.cancelled)
@@ -0,0 +1,198 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from traffic_accident_detector.clip_index import ClipIndexBuilder
+
+# formato del combo de configuración -> (extensión, fourcc)
+CLIP_FORMATS = {
+    'MP4': ('.mp4', 'mp4v'),
+    'AVI': ('.avi', 'XVID'),
+    'MKV': ('.mkv', 'XVID'),
+}
+
+_reserved = set()
+_reserved_lock = threading.Lock()
+
+
+def clip_extension(clip_format: str) -> str:
+    return _format(clip_format)[0]
+
+
+def _format(clip_format: str):
+    try:
+        return CLIP_FORMATS[clip_format.upper()]
+    except KeyError:
+        raise ValueError(f"Formato desconocido: {clip_format}. Opciones: {', '.join(CLIP_FORMATS)}")
+
+
+def part_path(path: str) -> str:
+    """Nombre con el que se escribe un archivo todavía incompleto: clip.part.mp4."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.part{ext}"
+
+
+def segment_path(path: str, index: int) -> str:
+    """Archivo del segmento `index` de un clip: clip.mp4, clip_001.mp4, ..."""
+    if index == 0:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{index:03d}{ext}"
+
+
+def reserve_path(directory: str, stem: str, ext: str) -> str:
+    """
+    Ruta libre para un clip nuevo. Cuenta los archivos en disco, los que se
+    están escribiendo (.part) y los reservados que el codificador aún no creó.
+    """
+    with _reserved_lock:
+        path = os.path.join(directory, f"{stem}{ext}")
+        n = 1
+        while path in _reserved or os.path.exists(path) or os.path.exists(part_path(path)):
+            path = os.path.join(directory, f"{stem}_{n}{ext}")
+            n += 1
+        _reserved.add(path)
+        return path
+
+
+def _release_path(path: str):
+    with _reserved_lock:
+        _reserved.discard(path)
+
+
+class ClipRecorder:
+    """
+    Grabación de un clip en un hilo codificador propio.
+
+    `write` solo encola el frame (sin copiarlo: no debe modificarse después) en
+    una cola acotada; la apertura del VideoWriter, la codificación y el cierre
+    ocurren en el hilo. Si el clip supera `segment_seconds` se cierra el archivo
+    y se sigue en uno nuevo (clip.mp4, clip_001.mp4, ...). Cada archivo se
+    escribe como .part y se renombra al terminarlo. Con `index=True` cada archivo
+    lleva su índice lateral (ver clip_index.py), armado en la misma pasada.
+
+    `close()` no espera: retorna un Future con la lista de archivos finales.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, fps: float, size, clip_format: str = 'MP4',
+                 segment_seconds: float = None, queue_size: int = 32, metrics=None,
+                 index: bool = True):
+        _, fourcc = _format(clip_format)
+        self.path = path
+        self.fps = fps
+        self.size = tuple(size)
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.segment_frames = int(round(segment_seconds * fps)) if segment_seconds else 0
+        self.metrics = metrics
+        self.index = index
+        self.future = Future()
+        self.segments = []
+        self.frames = 0
+        self.stalls = 0    # veces que la cola estaba llena y hubo que esperar
+
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="clip-encoder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, confidence: float = None):
+        """`confidence`: mayor confianza 'severe' del frame, para el índice del clip."""
+        self._put((frame, confidence))
+
+    def write_jpegs(self, frames):
+        """Frames comprimidos (p. ej. del buffer previo); se decodifican en el hilo."""
+        if frames:
+            self._put(list(frames))
+
+    def close(self) -> Future:
+        if not self._closed:
+            self._closed = True
+            self._put(self._STOP)
+        return self.future
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # el codificador no da abasto: se espera en vez de perder frames del clip
+            self.stalls += 1
+            if self.metrics is not None:
+                self.metrics.inc('encoder_stalls')
+            self._queue.put(item)
+
+    # -- hilo codificador ------------------------------------------------------
+
+    def _segment_path(self, index: int) -> str:
+        if index == 0:
+            return self.path
+        stem, ext = os.path.splitext(os.path.basename(segment_path(self.path, index)))
+        return reserve_path(os.path.dirname(self.path), stem, ext)
+
+    def _run(self):
+        writer = None
+        builder = None
+        current = None
+        in_segment = 0
+        item = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                if isinstance(item, list):
+                    frames = ((cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), None)
+                              for data in item)
+                else:
+                    frames = (item,)
+                for frame, confidence in frames:
+                    if frame is None:
+                        continue
+                    if writer is not None and self.segment_frames and in_segment >= self.segment_frames:
+                        self._finish(writer, current, builder)
+                        writer = None
+                    if writer is None:
+                        current = self._segment_path(len(self.segments))
+                        self.segments.append(current)
+                        writer = cv2.VideoWriter(part_path(current), self.fourcc, self.fps, self.size)
+                        builder = ClipIndexBuilder(current, self.fps, self.size) if self.index else None
+                        in_segment = 0
+                    t0 = time.perf_counter() if self.metrics is not None else 0.0
+                    writer.write(frame)
+                    if builder is not None:
+                        builder.add(frame, confidence)
+                    if self.metrics is not None:
+                        self.metrics.observe('encode', time.perf_counter() - t0)
+                    in_segment += 1
+                    self.frames += 1
+            if writer is not None:
+                self._finish(writer, current, builder)
+            self.future.set_result(list(self.segments))
+        except Exception as e:
+            if writer is not None:
+                writer.release()
+            for path in self.segments:
+                _release_path(path)
+            print(f"Error al codificar el clip {self.path}: {e}")
+            self.future.set_exception(e)
+            # seguir vaciando la cola para que quien escribe no quede bloqueado
+            while item is not self._STOP:
+                item = self._queue.get()
+        else:
+            if not self.segments:
+                _release_path(self.path)
+
+    @staticmethod
+    def _finish(writer, path, builder=None):
+        writer.release()
+        if builder is not None:
+            builder.finish()
+        os.replace(part_path(path), path)
+        _release_path(path)
+        print(f"Clip guardado: {path}")
@@ -0,0 +1,27 @@
+class AdaptiveStride:
+    """
+    Decide qué frames pasan por el modelo cuando se infiere cada N frames.
+
+    Mientras no haya detecciones 'severe' se infiere un frame de cada `stride`;
+    en cuanto aparece una se vuelve a inferir todos los frames, y el salto solo
+    se restablece cuando el conteo 'severe' regresa a cero.
+    """
+
+    def __init__(self, stride: int = 1):
+        self.stride = max(1, int(stride))
+        self.current = self.stride
+        self._since_last = None   # frames desde la última inferencia
+
+    def should_infer(self, frame) -> bool:
+        if self._since_last is None or self._since_last + 1 >= self.current:
+            self._since_last = 0
+            return True
+        self._since_last += 1
+        return False
+
+    def update(self, is_severe: bool, count_severe: int):
+        """Retroalimentación del estado 'severe' tras procesar cada frame."""
+        if is_severe:
+            self.current = 1
+        elif count_severe == 0:
+            self.current = self.stride
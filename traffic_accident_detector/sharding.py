@@ -0,0 +1,285 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from traffic_accident_detector.detector import AccidentDetector, DetectionSession
+from traffic_accident_detector.postprocess import to_numpy
+
+
+def plan_shards(total_frames: int, shards: int):
+    """Divide [0, total_frames) en rangos contiguos de tamaño similar."""
+    shards = max(1, min(shards, total_frames))
+    size = math.ceil(total_frames / shards)
+    return [(start, min(start + size, total_frames)) for start in range(0, total_frames, size)]
+
+
+def seek_frame(cap, video_path: str, start: int, overlap: int = 0):
+    """
+    Deja la captura lista para leer el frame `start`. Busca `overlap` frames
+    antes, lee la posición real en que quedó y decodifica sin usar los frames
+    hasta `start`: así una búsqueda imprecisa del contenedor no desalinea nada.
+    Si la búsqueda se pasó se vuelve a abrir el archivo y se decodifica desde el
+    principio. Retorna (captura, posición); la posición es menor que `start` si
+    el video terminó antes.
+    """
+    pos = -1
+    seek = max(0, start - overlap)
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, seek):
+        pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    # posición desconocida (sin búsqueda, o 0 tras buscar más adelante) o pasada de `start`
+    if not 0 <= pos <= start or (pos == 0 and seek):
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+        pos = 0
+    while pos < start and cap.grab():
+        pos += 1
+    return cap, pos
+
+
+def _process_shard(video_path, model_path, device, backend, int8, start, end, overlap,
+                   threads, batch_size, last):
+    """
+    Trabajo de un proceso: infiere los frames [start, end) con su propio modelo.
+
+    Llega a `start` con seek_frame (búsqueda `overlap` frames antes, verificada).
+    Retorna las detecciones crudas en forma columnar: `offsets[i]:offsets[i+1]`
+    son las cajas del frame start+i.
+    """
+    import torch
+    from traffic_accident_detector.models.loader import load_model
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    model = load_model(model_path, device, backend, int8)
+
+    cap, pos = seek_frame(cv2.VideoCapture(video_path), video_path, start, overlap)
+
+    boxes, confs, clss, counts = [], [], [], []
+    batch = []
+
+    def run_batch():
+        results = [model(batch[0])[0]] if len(batch) == 1 else model(batch)
+        for res in results:
+            boxes.append(to_numpy(res.boxes.xyxy, np.float32).reshape(-1, 4))
+            confs.append(to_numpy(res.boxes.conf, np.float32).reshape(-1))
+            clss.append(to_numpy(res.boxes.cls, np.int16).reshape(-1))
+            counts.append(len(confs[-1]))
+        batch.clear()
+
+    # el último rango lee hasta el final real del archivo (el conteo puede ser aproximado)
+    while last or pos < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        batch.append(frame)
+        pos += 1
+        if len(batch) >= batch_size:
+            run_batch()
+    if batch:
+        run_batch()
+    cap.release()
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    empty = (np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int16))
+    return {
+        'start': start,
+        'frames': len(counts),
+        'offsets': offsets,
+        'boxes': np.concatenate(boxes) if boxes else empty[0],
+        'confs': np.concatenate(confs) if confs else empty[1],
+        'clss': np.concatenate(clss) if clss else empty[2],
+    }
+
+
+def merge_shards(parts):
+    """Une los resultados por rango en una sola línea de tiempo columnar, en orden."""
+    parts = sorted(parts, key=lambda p: p['start'])
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for part in parts:
+        offsets.append(part['offsets'][1:] + base)
+        base += len(part['confs'])
+    return {
+        'frames': sum(p['frames'] for p in parts),
+        'offsets': np.concatenate(offsets),
+        'boxes': np.concatenate([p['boxes'] for p in parts]),
+        'confs': np.concatenate([p['confs'] for p in parts]),
+        'clss': np.concatenate([p['clss'] for p in parts]),
+    }
+
+
+def severe_flags(detector: AccidentDetector, timeline) -> np.ndarray:
+    """Por frame: ¿hay alguna caja 'severe' sobre el umbral de confianza?"""
+    hit = (timeline['confs'] >= detector.confidence_threshold) & \
+        detector.postprocess.severe.mask(timeline['clss'])
+    # cantidad de cajas 'severe' acumulada hasta cada offset
+    cum = np.concatenate([[0], np.cumsum(hit)])
+    offsets = timeline['offsets']
+    return cum[offsets[1:]] > cum[offsets[:-1]]
+
+
+def incident_ranges(flags, threshold: int, fps: int, pre_roll_frames: int = 0):
+    """
+    Aplica la lógica de conteo 'severe' sobre las banderas por frame y retorna los
+    rangos [inicio, fin] que hay que decodificar para cortar los clips.
+
+    Cada rango empieza donde el estado deja de estar en reposo (menos los frames
+    del buffer previo) y termina cuando se cierra la grabación; en ese punto el
+    estado vuelve a reposo, así que una sesión nueva reproduce el mismo clip.
+    Los incidentes que cruzan límites de rango quedan unidos de forma natural,
+    porque la lógica corre sobre la línea de tiempo ya fusionada.
+    """
+    ranges = []
+    count = 0
+    recording = False
+    recorded = False
+    cooldown = 0
+    active_start = None
+
+    for i, is_severe in enumerate(flags):
+        count = count + 1 if is_severe else max(0, count - 1)
+        if active_start is None and count > 0:
+            active_start = i
+        if count >= threshold and not recording:
+            recording = recorded = True
+        if recording:
+            cooldown += 1
+            if count == 0 and cooldown > fps * 2:
+                recording = False
+                cooldown = 0
+        if active_start is not None and count == 0 and not recording:
+            if recorded:
+                ranges.append([max(0, active_start - pre_roll_frames), i])
+            active_start = None
+            recorded = False
+
+    if active_start is not None and recorded:
+        ranges.append([max(0, active_start - pre_roll_frames), len(flags) - 1])
+
+    # unir rangos que se tocan: el buffer previo del siguiente cae dentro del anterior
+    merged = []
+    for rng in ranges:
+        if merged and rng[0] <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], rng[1])
+        else:
+            merged.append(rng)
+    return [tuple(r) for r in merged]
+
+
+def detect_from_video_sharded(detector: AccidentDetector, video_path: str,
+                              user_output_dir: str = None, workers: int = None,
+                              overlap: int = 8, shards_per_worker: int = 2):
+    """
+    Procesa un video largo en paralelo: cada proceso infiere un rango de frames
+    con su propia copia del modelo y su cuota de hilos; luego se fusionan las
+    detecciones, se aplica la lógica 'severe' sobre toda la línea de tiempo y solo
+    se decodifican de nuevo los tramos que terminan en un clip. Con el caché de
+    detecciones del detector, una segunda corrida salta la inferencia.
+
+    Retorna la lista de rutas de los clips generados.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("No se pudo abrir el video")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    cache = detector.detection_cache
+    cache_key = timeline = None
+    if cache is not None and detector.model_path:
+        cache_key = cache.key(video_path, detector.model_path, detector.imgsz, detector.backend,
+                              detector.int8)
+        timeline = cache.load(cache_key)
+        if timeline is not None:
+            print(f"Detecciones desde el caché ({timeline['frames']} frames), sin inferir")
+
+    if timeline is None:
+        timeline = _infer_sharded(detector, video_path, total, workers, overlap,
+                                  shards_per_worker)
+        if cache_key is not None:
+            cache.save(cache_key, timeline, source=os.path.basename(video_path),
+                       model=os.path.basename(detector.model_path), imgsz=detector.imgsz, fps=fps)
+
+    flags = severe_flags(detector, timeline)
+    pre_roll_frames = int(round(detector.pre_roll_seconds * fps))
+    ranges = incident_ranges(flags, detector.threshold_frames(fps), fps, pre_roll_frames)
+
+    video_dir = user_output_dir or detector.output_dir
+    os.makedirs(video_dir, exist_ok=True)
+    return cut_clips(detector, video_path, timeline, ranges, video_dir, fps, size)
+
+
+def _infer_sharded(detector: AccidentDetector, video_path: str, total: int, workers: int,
+                   overlap: int, shards_per_worker: int):
+    """Infiere el video por rangos en procesos aparte; retorna la línea de tiempo fusionada."""
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    shards = plan_shards(max(total, 1), workers * shards_per_worker)
+
+    started = time.monotonic()
+    ctx = multiprocessing.get_context('spawn')  # sin heredar estado de torch del padre
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        def submit(start, end, overlap, threads, last):
+            return pool.submit(_process_shard, video_path, detector.model_path, detector.device,
+                               detector.backend, detector.int8, start, end, overlap, threads,
+                               detector.batch_size, last)
+
+        futures = [submit(start, end, overlap, threads, i == len(shards) - 1)
+                   for i, (start, end) in enumerate(shards)]
+        parts = [f.result() for f in futures]
+
+        # un rango con otra cantidad de frames desalinearía todo lo que sigue:
+        # se repite la inferencia en un solo rango, decodificando desde el inicio
+        for (start, end), part in zip(shards[:-1], parts[:-1]):
+            if part['frames'] != end - start:
+                print(f"Advertencia: el rango {start}-{end} devolvió {part['frames']} frames; "
+                      f"se procesa el video en secuencia")
+                parts = [submit(0, total, 0, os.cpu_count() or 1, True).result()]
+                break
+
+    timeline = merge_shards(parts)
+    inference_time = time.monotonic() - started
+    print(f"Inferencia en paralelo: {timeline['frames']} frames, {len(parts)} rangos, "
+          f"{workers} procesos x {threads} hilos, {inference_time:.1f} s")
+    return timeline
+
+
+def cut_clips(detector: AccidentDetector, video_path: str, timeline, ranges,
+              video_dir: str, fps: int, size):
+    """Decodifica solo los rangos indicados y los pasa por una sesión nueva, sin inferir."""
+    clips = []
+
+    def on_clip(path):
+        clips.append(path)
+        if detector.callback:
+            detector.callback(path)
+
+    offsets = timeline['offsets']
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for start, end in ranges:
+            session = DetectionSession(detector, video_dir, fps, size, sinks=[], callback=on_clip,
+                                       camera=os.path.basename(video_path))
+            # la búsqueda se verifica: los frames deben coincidir con las cajas de la línea de tiempo
+            cap, pos = seek_frame(cap, video_path, start)
+            if pos < start:
+                break
+            for i in range(start, end + 1):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                a, b = offsets[i], offsets[i + 1]
+                session.process(frame, timeline['boxes'][a:b], timeline['confs'][a:b],
+                                timeline['clss'][a:b])
+            session.close()
+    finally:
+        cap.release()
+    return clips
@@ -0,0 +1,118 @@
+import cv2
+
+
+class FrameSink:
+    """
+    Destino de los frames procesados (ventana, vista previa Qt, archivo...).
+
+    `needs_annotated` indica si el sink necesita el frame con las cajas
+    dibujadas; si ningún sink lo necesita el detector no copia ni anota frames.
+    `write` retorna False para pedir que se detenga el procesamiento.
+    `detection` recibe, en cada frame, si el frame tiene un 'severe'.
+    `wants_frame` False omite el `write` de ese frame (y su anotación, si nadie
+    más la necesita); lo usan las vistas previas con límite de FPS.
+    """
+
+    needs_annotated = True
+
+    def wants_frame(self) -> bool:
+        return True
+
+    def write(self, frame) -> bool:
+        return True
+
+    def detection(self, is_severe: bool):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullSink(FrameSink):
+    """Descarta los frames; útil para correr sin ninguna salida visual."""
+
+    needs_annotated = False
+
+
+class WindowSink(FrameSink):
+    """Muestra los frames en una ventana de OpenCV; la tecla 'q' detiene el proceso."""
+
+    def __init__(self, title: str = "Detección de Accidentes"):
+        self.title = title
+        self.opened = False
+
+    def write(self, frame) -> bool:
+        cv2.imshow(self.title, frame)
+        self.opened = True
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    def close(self):
+        if self.opened:
+            cv2.destroyWindow(self.title)
+            self.opened = False
+
+
+class QtPreviewSink(FrameSink):
+    """
+    Entrega los frames como QPixmap a un callback (por ejemplo QLabel.setPixmap).
+
+    Con `throttle` (ver preview.PreviewThrottle) solo convierte los frames que
+    tocan según el FPS objetivo, ya reducidos al tamaño de la vista `key`.
+    """
+
+    def __init__(self, callback, convert=None, throttle=None, key=None):
+        self.callback = callback
+        self.convert = convert or frame_to_pixmap
+        self.throttle = throttle
+        self.key = key
+
+    def wants_frame(self) -> bool:
+        return self.throttle is None or self.throttle.due(self.key)
+
+    def write(self, frame) -> bool:
+        if self.throttle is not None:
+            frame = self.throttle.prepare(frame, self.key)
+            if frame is None:
+                return True
+        self.callback(self.convert(frame))
+        return True
+
+
+class VideoWriterSink(FrameSink):
+    """Escribe todos los frames anotados en un solo archivo de video."""
+
+    def __init__(self, path: str, fps: float = 25.0, fourcc: str = 'mp4v'):
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.writer = None
+
+    def write(self, frame) -> bool:
+        if self.writer is None:
+            h, w = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, self.fourcc, self.fps, (w, h))
+        self.writer.write(frame)
+        return True
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+def frame_to_pixmap(frame):
+    """
+    Convierte un frame BGR a QPixmap (importa PyQt5 solo cuando se usa).
+
+    La QImage se arma directamente sobre el buffer BGR del frame (Format_BGR888,
+    Qt >= 5.14), sin cvtColor; la única copia es la que hace QPixmap.
+    """
+    from PyQt5.QtGui import QImage, QPixmap
+
+    h, w = frame.shape[:2]
+    if not frame.flags['C_CONTIGUOUS']:
+        frame = frame.copy()
+    if hasattr(QImage, 'Format_BGR888'):
+        return QPixmap.fromImage(QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888))
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return QPixmap.fromImage(QImage(rgb.data, w, h, rgb.strides[0], QImage.Format_RGB888))
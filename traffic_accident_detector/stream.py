@@ -0,0 +1,260 @@
+import threading
+import time
+
+import cv2
+
+# fuentes que se tratan como cámaras en vivo (además de los índices de webcam)
+LIVE_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://',
+                'srt://', 'loop://')
+
+
+def is_live_source(source) -> bool:
+    """True para webcams (índice), URLs de streaming y archivos en bucle (loop://)."""
+    if isinstance(source, int):
+        return True
+    text = str(source).strip()
+    return text.isdigit() or text.lower().startswith(LIVE_SCHEMES)
+
+
+def open_capture(source, timeout: float = 5.0):
+    """
+    Abre una fuente en vivo con el buffer interno mínimo y, si la versión de
+    OpenCV lo permite, con timeouts de apertura/lectura: así un stream colgado
+    devuelve error en vez de bloquear la lectura para siempre.
+    `loop://ruta.mp4` abre un archivo local que simula una cámara.
+    """
+    if isinstance(source, str) and source.lower().startswith('loop://'):
+        return LoopingFileSource(source[len('loop://'):])
+    if isinstance(source, str) and source.strip().isdigit():
+        source = int(source)
+    cap = None
+    if hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_MSEC'):
+        ms = int(timeout * 1000)
+        try:
+            cap = cv2.VideoCapture(source, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms,
+                                                         cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
+        except (TypeError, cv2.error):
+            cap = None
+    if cap is None:
+        cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class LoopingFileSource:
+    """
+    Archivo de video que se comporta como una cámara en vivo, para probar sin
+    cámaras: entrega los frames al ritmo de su FPS (aunque nadie los lea) y
+    vuelve al inicio al terminar. Con `loops` se detiene tras esas vueltas.
+    Tiene la misma interfaz que cv2.VideoCapture (read/get/set/isOpened/release).
+    """
+
+    def __init__(self, path: str, fps: float = None, loops: int = None, realtime: bool = True):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 25
+        self.loops = loops
+        self.realtime = realtime
+        self.loop = 0
+        self._next = None
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return 0  # en vivo no hay largo conocido
+        return self.cap.get(prop)
+
+    def set(self, prop, value) -> bool:
+        return False
+
+    def read(self):
+        if self.realtime:
+            # un frame cada 1/fps; si el lector se atrasó no se entregan ráfagas
+            now = time.monotonic()
+            if self._next is None or now - self._next > 1.0 / self.fps:
+                self._next = now
+            elif self._next > now:
+                time.sleep(self._next - now)
+            self._next += 1.0 / self.fps
+        ret, frame = self.cap.read()
+        if not ret:
+            self.loop += 1
+            if self.loops is not None and self.loop >= self.loops:
+                return False, None
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class LatestFrameGrabber:
+    """
+    Lector de una fuente en vivo en su propio hilo que conserva solo el último
+    frame decodificado.
+
+    El hilo lee sin parar, así el buffer de OpenCV nunca se llena; `read()`
+    entrega el frame más nuevo que todavía no se entregó y los intermedios se
+    cuentan como descartados. Si la inferencia es más lenta que la cámara el
+    detector salta frames en vez de atrasarse: la latencia queda acotada a la
+    edad del frame más el tiempo de proceso.
+
+    Si el stream se corta o deja de entregar frames, se reconecta con espera
+    exponencial (`backoff`, duplicada hasta `max_backoff`); `max_reconnects`
+    limita los intentos (None = sin límite). Tiene la interfaz de
+    cv2.VideoCapture, así reemplaza al `cap` del detector sin más cambios.
+    """
+
+    def __init__(self, source, opener=None, timeout: float = 5.0, backoff: float = 0.5,
+                 max_backoff: float = 10.0, max_reconnects: int = None, metrics=None):
+        self.source = source
+        self.opener = opener or (lambda src: open_capture(src, timeout))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_reconnects = max_reconnects
+        self.metrics = metrics
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._frame = None
+        self._stamp = 0.0
+        self._seq = 0        # frames leídos de la fuente
+        self._taken = 0      # último frame entregado
+        self._finished = False
+
+        self.grabbed = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.stalls = 0
+        self.age_total = 0.0
+        self.age_max = 0.0
+
+        self.cap = self.opener(source)
+        self._opened = self.cap.isOpened()
+        # las propiedades se fijan con la primera conexión: no cambian al reconectar
+        self.fps = (self.cap.get(cv2.CAP_PROP_FPS) or 25) if self._opened else 0
+        self.width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH) if self._opened else 0
+        self.height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT) if self._opened else 0
+
+        self._thread = threading.Thread(target=self._run, name=f"stream-{source}", daemon=True)
+        if self._opened:
+            self._thread.start()
+        else:
+            self.cap.release()
+            self._finished = True
+
+    # -- interfaz de cv2.VideoCapture -------------------------------------------
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0  # p. ej. CAP_PROP_FRAME_COUNT: en vivo no hay largo conocido
+
+    def read(self):
+        """
+        Frame más nuevo aún no entregado; espera a que llegue uno si hace falta.
+        (False, None) cuando se detuvo o se agotaron las reconexiones.
+        """
+        with self._cond:
+            while self._seq == self._taken and not (self._finished or self._stop.is_set()):
+                self._cond.wait()
+            if self._seq == self._taken:
+                return False, None
+            self._taken = self._seq
+            frame, self._frame = self._frame, None
+            age = time.monotonic() - self._stamp
+            self.delivered += 1
+            self.age_total += age
+            self.age_max = max(self.age_max, age)
+        if self.metrics is not None:
+            self.metrics.observe('frame_age', age)
+        return True, frame
+
+    def stop(self):
+        """Despierta a quien espera en `read()`; el hilo termina tras su lectura actual."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self, timeout: float = 2.0):
+        self.stop()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    # -- hilo de lectura ----------------------------------------------------------
+
+    def _run(self):
+        cap = self.cap
+        delay = self.backoff
+        try:
+            while not self._stop.is_set():
+                ok, frame = cap.read() if cap is not None else (False, None)
+                if ok:
+                    delay = self.backoff
+                    with self._cond:
+                        if self._seq > self._taken:
+                            self.dropped += 1  # nadie llegó a leer el anterior
+                            if self.metrics is not None:
+                                self.metrics.inc('dropped_frames')
+                        self._frame = frame
+                        self._stamp = time.monotonic()
+                        self._seq += 1
+                        self.grabbed += 1
+                        self._cond.notify_all()
+                    continue
+
+                # corte o stream colgado (timeout de lectura): reconectar
+                self.stalls += 1
+                if cap is not None:
+                    cap.release()
+                    cap = self.cap = None
+                if self.max_reconnects is not None and self.reconnects >= self.max_reconnects:
+                    print(f"Fuente {self.source}: sin frames, se agotaron las reconexiones")
+                    break
+                print(f"Fuente {self.source}: sin frames, reconectando en {delay:.1f} s")
+                if self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_backoff)
+                self.reconnects += 1
+                cap = self.opener(self.source)
+                if not cap.isOpened():
+                    cap.release()
+                    cap = None
+                self.cap = cap
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            'grabbed': self.grabbed,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+            'stalls': self.stalls,
+            'avg_age_ms': 1000.0 * self.age_total / self.delivered if self.delivered else 0.0,
+            'max_age_ms': 1000.0 * self.age_max,
+        }
+
+
+def open_source(source, latest: bool = True, metrics=None):
+    """Captura para una fuente: con grabber de último frame si es en vivo."""
+    if latest and is_live_source(source):
+        return LatestFrameGrabber(source, metrics=metrics)
+    return cv2.VideoCapture(source)
@@ -0,0 +1,284 @@
+import mimetypes
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email import encoders
+
+
+class NotificationDispatcher:
+    """
+    Envío de alertas por correo en segundo plano.
+
+    - `notify` solo encola: nunca bloquea el hilo de detección. Los adjuntos
+      (snapshots, miniaturas) se leen del disco en el hilo de envío.
+    - Una sola sesión SMTP autenticada se reutiliza entre correos; si el
+      servidor la corta se reconecta. Tras `idle_timeout` segundos sin uso se
+      cierra para no depender del timeout del servidor.
+    - Los envíos fallidos se reintentan con espera exponencial (`backoff`,
+      duplicada en cada intento hasta `max_backoff`), hasta `max_retries`.
+    - Alertas repetidas de la misma cámara e incidente dentro de
+      `debounce_seconds` no se envían una por una: se juntan en un resumen que
+      sale al cerrarse la ventana.
+
+    Para probar contra un servidor SMTP local basta con host/port del stub,
+    `use_tls=False` y sin usuario.
+    """
+
+    def __init__(self, to_emails, host: str = 'smtp.gmail.com', port: int = 587,
+                 username: str = None, password: str = None, from_email: str = None,
+                 use_tls: bool = True, timeout: float = 10.0, debounce_seconds: float = 60.0,
+                 max_retries: int = 5, backoff: float = 1.0, max_backoff: float = 60.0,
+                 idle_timeout: float = 300.0, max_pending: int = 100, smtp_factory=smtplib.SMTP):
+        self.to_emails = [to_emails] if isinstance(to_emails, str) else list(to_emails)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.from_email = from_email or username or 'alertas@localhost'
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.debounce = debounce_seconds
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.max_pending = max_pending
+        self.smtp_factory = smtp_factory
+
+        self._queue = deque()      # mensajes listos para enviar
+        self._incidents = {}       # (cámara, incidente) -> estado de la ventana de debounce
+        self._cond = threading.Condition()
+        self._sending = False
+        self._closed = False
+        self._stop = threading.Event()   # corta las esperas entre reintentos al cerrar
+        self._smtp = None
+        self._last_used = 0.0
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.debounced = 0
+        self.connects = 0
+
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Configuración desde variables de entorno (SMTP_HOST, SMTP_PORT, SMTP_USER, ...)."""
+        to = os.getenv('ALERT_TO')
+        if not to:
+            return None
+        return cls([t.strip() for t in to.split(',') if t.strip()],
+                   host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                   port=int(os.getenv('SMTP_PORT', '587')),
+                   username=os.getenv('SMTP_USER') or None,
+                   password=os.getenv('SMTP_PASSWORD') or None,
+                   from_email=os.getenv('SMTP_FROM') or None,
+                   use_tls=os.getenv('SMTP_TLS', '1') not in ('0', 'false', 'no'),
+                   **kwargs)
+
+    # -- API -------------------------------------------------------------------
+
+    def notify(self, camera: str, details: str, incident=None, attachments=()) -> bool:
+        """
+        Encola una alerta. Retorna False si se descartó (cola llena o cerrado).
+        Si la misma cámara/incidente ya avisó hace menos de `debounce_seconds`,
+        la alerta se agrega al resumen pendiente.
+        """
+        key = (camera, incident)
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                return False
+            state = self._incidents.get(key)
+            if state is not None and now - state['sent_at'] < self.debounce:
+                state['pending'].append((time.time(), details))
+                # solo los adjuntos más recientes, para no mandar correos enormes
+                state['attachments'] = (state['attachments'] + list(attachments))[-3:]
+                self.debounced += 1
+                self._cond.notify_all()
+                return True
+            if len(self._queue) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._incidents[key] = {'sent_at': now, 'pending': [], 'attachments': []}
+            self._queue.append(self._message(camera, "Accidente Detectado",
+                                             f"Se ha detectado un accidente. Detalles: {details}",
+                                             attachments))
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: float = None, digests: bool = True) -> bool:
+        """
+        Espera a que se envíe todo lo encolado. Con `digests` también envía ya
+        los resúmenes pendientes, sin esperar a que cierre su ventana.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if digests:
+                self._collect_digests(force=True)
+                self._cond.notify_all()
+            while self._queue or self._sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'debounced': self.debounced,
+            'pending': len(self._queue),
+            'connects': self.connects,
+        }
+
+    # -- resúmenes -------------------------------------------------------------
+
+    @staticmethod
+    def _message(camera, subject, body, attachments):
+        return {'camera': camera, 'subject': subject, 'body': body,
+                'attachments': list(attachments)}
+
+    def _collect_digests(self, force: bool = False):
+        """Pasa a la cola los resúmenes cuya ventana terminó (con el lock tomado)."""
+        now = time.monotonic()
+        for key, state in list(self._incidents.items()):
+            expired = now - state['sent_at'] >= self.debounce
+            if state['pending'] and (expired or force):
+                camera, incident = key
+                lines = [f"- {time.strftime('%H:%M:%S', time.localtime(t))}: {d}"
+                         for t, d in state['pending']]
+                source = camera if incident is None else f"{camera} (incidente {incident})"
+                body = f"{len(lines)} alertas más de la cámara {source}:\n" + '\n'.join(lines)
+                self._queue.append(self._message(camera, f"Resumen de alertas: {camera}", body,
+                                                 state['attachments']))
+                self._incidents[key] = {'sent_at': now, 'pending': [], 'attachments': []}
+            elif expired and not state['pending']:
+                del self._incidents[key]  # ventana cerrada sin repeticiones
+
+    def _next_deadline(self):
+        deadlines = [state['sent_at'] + self.debounce for state in self._incidents.values()
+                     if state['pending']]
+        return min(deadlines) if deadlines else None
+
+    # -- hilo de envío ---------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    self._collect_digests()
+                    if self._queue or self._closed:
+                        break
+                    deadline = self._next_deadline()
+                    wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    if self._smtp is not None:
+                        idle = self._last_used + self.idle_timeout - time.monotonic()
+                        wait = idle if wait is None else min(wait, idle)
+                        if wait <= 0:
+                            break
+                    self._cond.wait(wait)
+                if not self._queue:
+                    if self._closed:
+                        self._disconnect()
+                        return
+                    self._disconnect()  # sesión inactiva
+                    continue
+                message = self._queue.popleft()
+                self._sending = True
+            try:
+                self._deliver(message)
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()
+
+    def _deliver(self, message):
+        try:
+            data = self._build(message)
+        except Exception as e:
+            self.failed += 1
+            print(f"Error al preparar la alerta: {e}")
+            return
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connect().sendmail(self.from_email, self.to_emails, data)
+                self._last_used = time.monotonic()
+                self.sent += 1
+                print("Correo enviado con éxito")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                self._disconnect()
+                if attempt == self.max_retries:
+                    break
+                print(f"Error al enviar correo ({e}); reintento en {delay:.0f} s")
+                if self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_backoff)
+        self.failed += 1
+        print("No se pudo enviar la alerta")
+
+    def _connect(self):
+        if self._smtp is None:
+            smtp = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self.connects += 1
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _build(self, message) -> str:
+        """Arma el correo; los adjuntos se leen aquí, en el hilo de envío."""
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = ', '.join(self.to_emails)
+        msg['Subject'] = message['subject']
+        msg.attach(MIMEText(message['body'], 'plain'))
+        for path in message['attachments']:
+            try:
+                with open(path, 'rb') as f:
+                    payload = f.read()
+            except OSError as e:
+                print(f"Adjunto omitido {path}: {e}")
+                continue
+            ctype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            maintype, subtype = ctype.split('/', 1)
+            part = MIMEBase(maintype, subtype)
+            part.set_payload(payload)
+            encoders.encode_base64(part)
+            part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
+            msg.attach(part)
+        return msg.as_string()
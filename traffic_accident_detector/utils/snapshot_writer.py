@@ -0,0 +1,179 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+
+
+class SnapshotWriter:
+    """
+    Escritor en segundo plano de snapshots para el dataset (imagen + .txt YOLO).
+
+    El hilo de detección solo encola; la codificación JPEG, la escritura y el
+    fsync ocurren en un hilo aparte. La cola es acotada: si se llena, 'coalesce'
+    reemplaza el snapshot pendiente más nuevo por el recibido (gana el más
+    reciente) y 'drop' descarta el recibido; nunca se bloquea la inferencia.
+    Los fsync se hacen por lotes de `fsync_every` archivos y en `flush()`.
+    """
+
+    POLICIES = ('coalesce', 'drop')
+
+    def __init__(self, max_queue: int = 16, jpeg_quality: int = 95, fsync_every: int = 8,
+                 policy: str = 'coalesce', metrics=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Opciones: {', '.join(self.POLICIES)}")
+        self.max_queue = max_queue
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.fsync_every = max(1, fsync_every)
+        self.policy = policy
+        self.metrics = metrics
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._unsynced = []   # descriptores escritos y aún sin fsync
+        self._seq = itertools.count()
+
+        self.written = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def unique_name(self, now: datetime = None) -> str:
+        """Nombre sin colisiones: fecha con microsegundos, pid y secuencia."""
+        now = now or datetime.now()
+        return f"{now.strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}_{next(self._seq):06d}"
+
+    def submit(self, img_path: str, frame, lbl_path: str, label_text: str) -> bool:
+        """
+        Encola un snapshot. El frame no se copia: quien llama no debe modificarlo
+        después. Retorna False si se descartó por falta de espacio.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._pending) >= self.max_queue:
+                if self.policy == 'drop':
+                    self.dropped += 1
+                    self._count('snapshots_dropped')
+                    return False
+                self._pending.pop()
+                self.coalesced += 1
+                self._count('snapshots_coalesced')
+            self._pending.append((img_path, frame, lbl_path, label_text))
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera a que se escriba todo lo encolado y hace fsync. False si venció el tiempo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            fds = self._take_unsynced()
+        self._sync(fds)
+        return True
+
+    def close(self, timeout: float = None):
+        """Vacía la cola (flush) y detiene el hilo."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'written': self.written,
+            'pending': len(self._pending),
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+        }
+
+    # -- hilo de escritura -----------------------------------------------------
+
+    def _count(self, counter):
+        if self.metrics is not None:
+            self.metrics.inc(counter)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    fds = self._take_unsynced()
+                    break
+                item = self._pending.popleft()
+                self._busy = True
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error al guardar snapshot {item[0]}: {e}")
+            with self._cond:
+                fds = self._take_unsynced() if len(self._unsynced) >= 2 * self.fsync_every else []
+            self._sync(fds)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+        self._sync(fds)
+
+    def _write(self, img_path, frame, lbl_path, label_text):
+        t0 = time.perf_counter()
+        ok, buf = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ok:
+            raise RuntimeError("no se pudo codificar la imagen")
+        img_fd = self._write_file(img_path, buf.tobytes())
+        try:
+            fds = [img_fd, self._write_file(lbl_path, label_text.encode('utf-8'))]
+        except BaseException:
+            os.close(img_fd)
+            raise
+        with self._cond:
+            self._unsynced.extend(fds)
+        self.written += 1
+        if self.metrics is not None:
+            self.metrics.observe('snapshot_write', time.perf_counter() - t0)
+
+    @staticmethod
+    def _write_file(path, data) -> int:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _take_unsynced(self) -> list:
+        """Saca los descriptores pendientes de fsync (se llama con el lock tomado)."""
+        fds, self._unsynced = self._unsynced, []
+        return fds
+
+    def _sync(self, fds):
+        """fsync y cierre de `fds`, fuera del lock; un error no corta el resto."""
+        for fd in fds:
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                self.errors += 1
+                print(f"Error en fsync de snapshot (fd {fd}): {e}")
+            finally:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass